@@ -1,54 +1,59 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, stream_with_context, current_app
 from models import db, Category, Service, Portfolio, SiteSettings, QuoteRequest, Contact
-from datetime import datetime
-import os
-from werkzeug.utils import secure_filename
+from cache import TAGS, invalidate
+from page_cache import page_cache
+from counters import adjust, counter_name, dashboard_stats, read_counters
+from pagination import keyset_paginate
+from images import process_image_async
+from storage import save_upload
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
+import csv
+import io
+import json
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+QUOTE_STATES = ['pendiente', 'en_proceso', 'completada', 'cancelada']
+CONTACT_STATES = ['nuevo', 'leido', 'respondido', 'cerrado']
+
+# Rows fetched from the database, and written to the response, at a time
+EXPORT_BATCH_SIZE = 1000
+
 # Helper function for file uploads
 def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def upload_file(file, folder='uploads'):
-    """Upload file and return filename"""
+    """Upload file and return its content-addressed URL"""
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        # Add timestamp to avoid conflicts
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-        filename = timestamp + filename
-        
-        upload_folder = os.path.join('static', 'images', folder)
-        os.makedirs(upload_folder, exist_ok=True)
-        
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
-        return f'/static/images/{folder}/{filename}'
+        # Only the extension is kept, and allowed_file() has checked it
+        extension = file.filename.rsplit('.', 1)[1].lower()
+        return save_upload(file, folder, extension)
     return None
 
 # Admin Dashboard
 @admin_bp.route('/')
 def dashboard():
     """Admin dashboard"""
-    stats = {
-        'total_services': Service.query.count(),
-        'active_services': Service.query.filter_by(activo=True).count(),
-        'total_portfolio': Portfolio.query.count(),
-        'active_portfolio': Portfolio.query.filter_by(activo=True).count(),
-        'quote_requests': QuoteRequest.query.count(),
-        'pending_quotes': QuoteRequest.query.filter_by(estado='pendiente').count(),
-        'contacts': Contact.query.count(),
-        'new_contacts': Contact.query.filter_by(estado='nuevo').count()
-    }
+    stats = dashboard_stats()
     
-    recent_quotes = QuoteRequest.query.order_by(QuoteRequest.created_at.desc()).limit(5).all()
+    recent_quotes = QuoteRequest.query.options(joinedload(QuoteRequest.categoria)).order_by(
+        QuoteRequest.created_at.desc()).limit(5).all()
     recent_contacts = Contact.query.order_by(Contact.created_at.desc()).limit(5).all()
     
     return render_template('admin/dashboard.html', 
                          stats=stats,
                          recent_quotes=recent_quotes,
-                         recent_contacts=recent_contacts)
+                         recent_contacts=recent_contacts,
+                         today=datetime.now())
+
+@admin_bp.route('/api/estadisticas')
+def api_estadisticas():
+    """Dashboard stats as JSON for polling"""
+    return jsonify(dashboard_stats())
 
 # Categories Management
 @admin_bp.route('/categorias')
@@ -71,6 +76,7 @@ def nueva_categoria():
         categoria = Category(nombre=nombre, descripcion=descripcion)
         db.session.add(categoria)
         db.session.commit()
+        invalidate('services')
         
         flash('Categoría creada exitosamente.', 'success')
         return redirect(url_for('admin.categorias'))
@@ -91,6 +97,7 @@ def editar_categoria(categoria_id):
             return render_template('admin/categoria_form.html', categoria=categoria)
         
         db.session.commit()
+        invalidate('services')
         flash('Categoría actualizada exitosamente.', 'success')
         return redirect(url_for('admin.categorias'))
     
@@ -107,6 +114,7 @@ def eliminar_categoria(categoria_id):
     else:
         db.session.delete(categoria)
         db.session.commit()
+        invalidate('services')
         flash('Categoría eliminada exitosamente.', 'success')
     
     return redirect(url_for('admin.categorias'))
@@ -150,6 +158,8 @@ def nuevo_servicio():
         )
         db.session.add(servicio)
         db.session.commit()
+        invalidate('services')
+        process_image_async(servicio, 'services')
         
         flash('Servicio creado exitosamente.', 'success')
         return redirect(url_for('admin.servicios'))
@@ -181,8 +191,12 @@ def editar_servicio(servicio_id):
                 imagen_url = upload_file(file, 'servicios')
                 if imagen_url:
                     servicio.imagen = imagen_url
+                    servicio.imagen_variantes = None
         
         db.session.commit()
+        invalidate('services')
+        if servicio.imagen and not servicio.imagen_variantes:
+            process_image_async(servicio, 'services')
         flash('Servicio actualizado exitosamente.', 'success')
         return redirect(url_for('admin.servicios'))
     
@@ -195,6 +209,7 @@ def eliminar_servicio(servicio_id):
     servicio = Service.query.get_or_404(servicio_id)
     db.session.delete(servicio)
     db.session.commit()
+    invalidate('services')
     flash('Servicio eliminado exitosamente.', 'success')
     return redirect(url_for('admin.servicios'))
 
@@ -248,6 +263,8 @@ def nuevo_portafolio():
         )
         db.session.add(portfolio_item)
         db.session.commit()
+        invalidate('portfolio')
+        process_image_async(portfolio_item, 'portfolio')
         
         flash('Proyecto agregado al portafolio exitosamente.', 'success')
         return redirect(url_for('admin.admin_portafolio'))
@@ -286,8 +303,12 @@ def editar_portafolio(portfolio_id):
                 imagen_url = upload_file(file, 'portfolio')
                 if imagen_url:
                     portfolio_item.imagen = imagen_url
+                    portfolio_item.imagen_variantes = None
         
         db.session.commit()
+        invalidate('portfolio')
+        if portfolio_item.imagen and not portfolio_item.imagen_variantes:
+            process_image_async(portfolio_item, 'portfolio')
         flash('Proyecto actualizado exitosamente.', 'success')
         return redirect(url_for('admin.admin_portafolio'))
     
@@ -299,6 +320,7 @@ def eliminar_portafolio(portfolio_id):
     portfolio_item = Portfolio.query.get_or_404(portfolio_id)
     db.session.delete(portfolio_item)
     db.session.commit()
+    invalidate('portfolio')
     flash('Proyecto eliminado del portafolio exitosamente.', 'success')
     return redirect(url_for('admin.admin_portafolio'))
 
@@ -325,6 +347,7 @@ def actualizar_configuracion():
                 db.session.add(new_setting)
     
     db.session.commit()
+    invalidate('settings')
     flash('Configuración actualizada exitosamente.', 'success')
     return redirect(url_for('admin.configuracion'))
 
@@ -333,15 +356,16 @@ def actualizar_configuracion():
 def cotizaciones():
     """Manage quote requests"""
     estado = request.args.get('estado', 'todas')
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     
     query = QuoteRequest.query
     if estado != 'todas':
         query = query.filter_by(estado=estado)
+        total = read_counters().get(counter_name('quote_requests', 'estado', estado), 0)
+    else:
+        total = read_counters().get(counter_name('quote_requests'), 0)
     
-    quotes = query.order_by(QuoteRequest.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    quotes = keyset_paginate(query, QuoteRequest, cursor=cursor, per_page=20, total=total)
     
     return render_template('admin/cotizaciones.html', quotes=quotes, estado_filtro=estado)
 
@@ -357,7 +381,7 @@ def actualizar_estado_cotizacion(quote_id):
     quote = QuoteRequest.query.get_or_404(quote_id)
     nuevo_estado = request.form.get('estado')
     
-    if nuevo_estado in ['pendiente', 'en_proceso', 'completada', 'cancelada']:
+    if nuevo_estado in QUOTE_STATES:
         quote.estado = nuevo_estado
         db.session.commit()
         flash('Estado actualizado exitosamente.', 'success')
@@ -371,15 +395,16 @@ def actualizar_estado_cotizacion(quote_id):
 def contactos():
     """Manage contacts"""
     estado = request.args.get('estado', 'todos')
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     
     query = Contact.query
     if estado != 'todos':
         query = query.filter_by(estado=estado)
+        total = read_counters().get(counter_name('contacts', 'estado', estado), 0)
+    else:
+        total = read_counters().get(counter_name('contacts'), 0)
     
-    contacts = query.order_by(Contact.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    contacts = keyset_paginate(query, Contact, cursor=cursor, per_page=20, total=total)
     
     return render_template('admin/contactos.html', contacts=contacts, estado_filtro=estado)
 
@@ -395,7 +420,7 @@ def actualizar_estado_contacto(contact_id):
     contact = Contact.query.get_or_404(contact_id)
     nuevo_estado = request.form.get('estado')
     
-    if nuevo_estado in ['nuevo', 'leido', 'respondido', 'cerrado']:
+    if nuevo_estado in CONTACT_STATES:
         contact.estado = nuevo_estado
         db.session.commit()
         flash('Estado actualizado exitosamente.', 'success')
@@ -404,6 +429,147 @@ def actualizar_estado_contacto(contact_id):
     
     return redirect(url_for('admin.ver_contacto', contact_id=contact_id))
 
+# Bulk Status Changes
+def bulk_update_estado(model, states, prefix):
+    """Move many rows to a new estado and return the JSON response
+
+    Form fields: estado (the new one), and the rows to change as ids
+    (repeated or comma-separated) and/or a filter of estado_actual and
+    dias (only rows created more than that many days ago).
+    """
+    nuevo_estado = request.form.get('estado')
+    if nuevo_estado not in states:
+        return jsonify({'error': 'Estado inválido.'}), 400
+    try:
+        ids = [int(value) for item in request.form.getlist('ids') for value in item.split(',') if value.strip()]
+        dias = int(request.form['dias']) if request.form.get('dias') else None
+    except ValueError:
+        return jsonify({'error': 'ids y dias deben ser números.'}), 400
+    estado_actual = request.form.get('estado_actual')
+    if estado_actual and estado_actual not in states:
+        return jsonify({'error': 'Estado actual inválido.'}), 400
+    if not ids and not estado_actual and dias is None:
+        return jsonify({'error': 'Indica ids o un filtro (estado_actual, dias).'}), 400
+
+    conditions = []
+    if ids:
+        conditions.append(model.id.in_(ids))
+    if dias is not None:
+        conditions.append(model.created_at < datetime.utcnow() - timedelta(days=dias))
+
+    # One UPDATE per current state: its rowcount is exactly how many rows
+    # left that state, so the counters stay right without reading the rows
+    actualizados = 0
+    deltas = {}
+    with db.engine.begin() as connection:
+        for estado in states:
+            if estado == nuevo_estado or (estado_actual and estado != estado_actual):
+                continue
+            result = connection.execute(
+                update(model).where(model.estado == estado, *conditions).values(estado=nuevo_estado))
+            if result.rowcount:
+                actualizados += result.rowcount
+                deltas[counter_name(prefix, 'estado', estado)] = -result.rowcount
+        deltas[counter_name(prefix, 'estado', nuevo_estado)] = actualizados
+        adjust(connection, deltas)
+    return jsonify({'actualizados': actualizados, 'estado': nuevo_estado})
+
+@admin_bp.route('/cotizaciones/estado', methods=['POST'])
+def actualizar_estado_cotizaciones():
+    """Change the status of many quote requests at once"""
+    return bulk_update_estado(QuoteRequest, QUOTE_STATES, 'quote_requests')
+
+@admin_bp.route('/contactos/estado', methods=['POST'])
+def actualizar_estado_contactos():
+    """Change the status of many contacts at once"""
+    return bulk_update_estado(Contact, CONTACT_STATES, 'contacts')
+
+# CSV/JSONL Exports
+def _export_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+def _export_rows(query, columns, formato):
+    """Encode rows in chunks of EXPORT_BATCH_SIZE as they arrive"""
+    rows = db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    buffer = io.StringIO()
+    if formato == 'csv':
+        writer = csv.writer(buffer)
+        # The BOM makes Excel read the accents as UTF-8
+        buffer.write('\ufeff')
+        writer.writerow(columns)
+    for partition in rows.partitions():
+        for row in partition:
+            values = [_export_value(value) for value in row]
+            if formato == 'csv':
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False) + '\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_response(model, states, name):
+    """Stream a model's rows as CSV or JSONL, filtered by estado and date
+
+    Query parameters: formato (csv or jsonl), estado, and desde/hasta
+    (YYYY-MM-DD, both inclusive) on created_at.
+    """
+    formato = request.args.get('formato', 'csv')
+    estado = request.args.get('estado')
+    if formato not in ('csv', 'jsonl') or (estado and estado not in states):
+        abort(400)
+    try:
+        desde = request.args.get('desde') and datetime.strptime(request.args['desde'], '%Y-%m-%d')
+        hasta = request.args.get('hasta') and datetime.strptime(request.args['hasta'], '%Y-%m-%d')
+    except ValueError:
+        abort(400)
+
+    columns = [column.key for column in model.__table__.columns]
+    query = select(*model.__table__.columns).order_by(model.id)
+    if estado:
+        query = query.where(model.estado == estado)
+    if desde:
+        query = query.where(model.created_at >= desde)
+    if hasta:
+        query = query.where(model.created_at < hasta + timedelta(days=1))
+
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d')}.{formato}"
+    mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    return current_app.response_class(
+        stream_with_context(_export_rows(query, columns, formato)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@admin_bp.route('/cotizaciones/exportar')
+def exportar_cotizaciones():
+    """Download quote requests as CSV or JSONL"""
+    return export_response(QuoteRequest, QUOTE_STATES, 'cotizaciones')
+
+@admin_bp.route('/contactos/exportar')
+def exportar_contactos():
+    """Download contacts as CSV or JSONL"""
+    return export_response(Contact, CONTACT_STATES, 'contactos')
+
+# Cache Management
+@admin_bp.route('/cache')
+def cache_stats():
+    """Full-page cache statistics"""
+    return jsonify(page_cache.stats())
+
+@admin_bp.route('/cache/purgar', methods=['POST'])
+def purgar_cache():
+    """Invalidate cached pages by tag (all tags if none given)"""
+    tags = request.form.getlist('tag') or ['settings', 'services', 'portfolio']
+    unknown = [tag for tag in tags if tag not in TAGS]
+    if unknown:
+        return jsonify({'error': f'Etiquetas desconocidas: {", ".join(unknown)}', 'tags': list(TAGS)}), 400
+    invalidate(*tags)
+    return jsonify({'purged': tags, 'stats': page_cache.stats()})
+
 def init_admin(app):
     """Initialize admin blueprint"""
     app.register_blueprint(admin_bp)
\ No newline at end of file
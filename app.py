@@ -2,10 +2,27 @@ from flask import Flask, render_template, request, redirect, url_for, flash, jso
 from flask_sqlalchemy import SQLAlchemy
 from models import db, Category, Service, Portfolio, SiteSettings, QuoteRequest, Contact
 from admin import init_admin
+from cache import CachedLoader, tag_version
+from page_cache import page_cache
+from compression import compression
+from metrics import metrics
+from replica import replica
+from migrations import upgrade_database
+from outbox import enqueue_mailerlite_subscription, mailerlite_subscription, start_worker_thread
+from ingest import ingest
+from images import srcset
+from streaming import LazyRows, stream_page
+import search
+import fixtures
+import background
+import sqlite_tuning
+import storage
+import assets
+from sqlalchemy import func, select
 import os
 from dotenv import load_dotenv
-import requests
 from datetime import datetime
+from collections import namedtuple
 
 # Load environment variables
 load_dotenv()
@@ -14,93 +31,94 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///araiza_inc.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['PAGE_CACHE_BACKEND'] = os.getenv('PAGE_CACHE_BACKEND', 'memory')
+app.config['PAGE_CACHE_MAX_BYTES'] = int(os.getenv('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+app.config['PAGE_CACHE_VERSION'] = os.getenv('PAGE_CACHE_VERSION')
+app.config['OUTBOX_WORKER'] = os.getenv('OUTBOX_WORKER', 'thread')
+app.config['OUTBOX_POLL_INTERVAL'] = float(os.getenv('OUTBOX_POLL_INTERVAL', 5))
+app.config['OUTBOX_HTTP_TIMEOUT'] = float(os.getenv('OUTBOX_HTTP_TIMEOUT', 10))
+app.config['VENDOR_ASSETS'] = os.getenv('VENDOR_ASSETS', '0') == '1'
+app.config['STREAM_TEMPLATES'] = os.getenv('STREAM_TEMPLATES', '0') == '1'
+app.config['COMPRESS_ALGORITHMS'] = os.getenv('COMPRESS_ALGORITHMS', 'br,gzip')
+app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', 6))
+app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+app.config['SERVER_TIMING'] = os.getenv('SERVER_TIMING', '0') == '1'
+app.config['METRICS_DEBUG'] = os.getenv('METRICS_DEBUG', '0') == '1'
+app.config['METRICS_N_PLUS_ONE_THRESHOLD'] = int(os.getenv('METRICS_N_PLUS_ONE_THRESHOLD', 10))
+app.config['INGEST_MODE'] = os.getenv('INGEST_MODE', 'direct')
+app.config['INGEST_DIR'] = os.getenv('INGEST_DIR', os.path.join(app.instance_path, 'ingest'))
+app.config['INGEST_FLUSH_MS'] = int(os.getenv('INGEST_FLUSH_MS', 200))
+app.config['INGEST_BATCH_SIZE'] = int(os.getenv('INGEST_BATCH_SIZE', 500))
+app.config['INGEST_FSYNC'] = os.getenv('INGEST_FSYNC', '0') == '1'
+app.config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_CACHE_SIZE_KB'] = int(os.getenv('SQLITE_CACHE_SIZE_KB', 16384))
+app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+app.config['SQLITE_TEMP_STORE'] = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
+app.config['SQLITE_JOURNAL_SIZE_LIMIT'] = int(os.getenv('SQLITE_JOURNAL_SIZE_LIMIT', 64 * 1024 * 1024))
+app.config['SQLITE_POOL_SIZE'] = int(os.getenv('SQLITE_POOL_SIZE', 5))
+app.config['SQLITE_POOL_OVERFLOW'] = int(os.getenv('SQLITE_POOL_OVERFLOW', 10))
+app.config['SQLITE_MAINTENANCE_INTERVAL'] = float(os.getenv('SQLITE_MAINTENANCE_INTERVAL', 3600))
+app.config['READ_REPLICA_URL'] = os.getenv('READ_REPLICA_URL', '')
+app.config['READ_REPLICA_SNAPSHOT'] = os.getenv('READ_REPLICA_SNAPSHOT', '')
+app.config['READ_REPLICA_SNAPSHOT_INTERVAL'] = float(os.getenv('READ_REPLICA_SNAPSHOT_INTERVAL', 0))
+app.config['READ_REPLICA_MAX_LAG'] = float(os.getenv('READ_REPLICA_MAX_LAG', 5))
+app.config['READ_REPLICA_STICKY_SECONDS'] = float(os.getenv('READ_REPLICA_STICKY_SECONDS', 30))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_tuning.engine_options(app.config)
 
 # Initialize database
 db.init_app(app)
 
+# WAL, busy timeout and the other pragmas on every SQLite connection
+sqlite_tuning.init_app(app)
+
+# Per-endpoint timings at /metrics; first, so it also times the hooks below
+metrics.init_app(app)
+
+# Public reads from a replica when one is configured
+replica.init_app(app)
+
+# Initialize full-page cache
+page_cache.init_app(app)
+
+# gzip/brotli for HTML and JSON responses
+compression.init_app(app)
+
+# Responsive image helpers for templates
+app.add_template_filter(srcset)
+
+# Immutable caching for content-addressed uploads
+storage.init_app(app)
+
+# Fingerprinted, precompressed CSS/JS (see assets.py)
+assets.init_app(app)
+
 # Initialize admin
 init_admin(app)
 
+# Group-commit form submissions when INGEST_MODE=journal
+ingest.init_app(app)
+
+# Deliver queued MailerLite subscriptions in the background of each web process
+if app.config['OUTBOX_WORKER'] == 'thread':
+    background.on_first_request(app, start_worker_thread, app)
+
 def init_database_if_needed():
     """Initialize database with default data if needed"""
     try:
         # Create all tables
         db.create_all()
         
+        # Add columns introduced after the database was created
+        upgrade_database()
+        
         # Check if categories already exist
         if Category.query.count() == 0:
             print("🔨 No data found, initializing database with default content...")
             
-            # Create categories
-            categories_data = [
-                {"id": 1, "nombre": "Tecnología y Desarrollo", "descripcion": "Desarrollo de software, web y automatización"},
-                {"id": 2, "nombre": "Telecomunicaciones y Telefonía", "descripcion": "Telefonía IP, VoIP, SMS y multicanal"},
-                {"id": 3, "nombre": "Agencia de Viajes", "descripcion": "Boletos, tours, comisiones y seguros"},
-                {"id": 4, "nombre": "Diseño Gráfico y Marketing", "descripcion": "Branding, publicidad digital y diseño"},
-                {"id": 5, "nombre": "Electrónica y Proyectos DIY", "descripcion": "IoT, autos, CNC y hardware"},
-                {"id": 6, "nombre": "Inteligencia Artificial y Data", "descripcion": "Modelos AI, chatbots, análisis de datos"}
-            ]
-            
-            for cat_data in categories_data:
-                category = Category(id=cat_data["id"], nombre=cat_data["nombre"], descripcion=cat_data["descripcion"])
-                db.session.add(category)
-            
-            # Create services
-            services_data = [
-                {"id": 1, "id_categoria": 1, "nombre": "Desarrollo Web", "descripcion": "Sitios en WordPress, Divi, Flask, React, PHP"},
-                {"id": 2, "id_categoria": 1, "nombre": "Aplicaciones AI", "descripcion": "Apps Flask con chatbots, WhatsApp, SMS, voz"},
-                {"id": 3, "id_categoria": 1, "nombre": "Automatización n8n", "descripcion": "Flujos automáticos, integración con APIs"},
-                {"id": 4, "id_categoria": 1, "nombre": "Bases de Datos", "descripcion": "MySQL, SQLite, FileMaker, reportes y APIs"},
-                {"id": 5, "id_categoria": 1, "nombre": "DevOps & Hosting", "descripcion": "Proxmox, Vultr, Nginx, Docker, LXC, SSL"},
-                {"id": 6, "id_categoria": 2, "nombre": "PBX y VoIP", "descripcion": "Asterisk, Issabel, LiveKit, Telnyx SIP Trunk"},
-                {"id": 7, "id_categoria": 2, "nombre": "IVR y Call Routing", "descripcion": "Menús automáticos, grabaciones, AI en llamadas"},
-                {"id": 8, "id_categoria": 2, "nombre": "SMS & WhatsApp", "descripcion": "Integración con Telnyx, WhatsApp Business API"},
-                {"id": 9, "id_categoria": 3, "nombre": "Reservaciones y Boletos", "descripcion": "Amadeus, Sabre, consolidación de ventas"},
-                {"id": 10, "id_categoria": 3, "nombre": "Tours y Paquetes", "descripcion": "Organización de viajes y experiencias"},
-                {"id": 11, "id_categoria": 3, "nombre": "Seguros de Viaje", "descripcion": "Cotización automática y APIs de proveedores"},
-                {"id": 12, "id_categoria": 3, "nombre": "Subagencias y Comisiones", "descripcion": "Reportes ARC, reglas de aerolíneas"},
-                {"id": 13, "id_categoria": 4, "nombre": "Diseño Gráfico", "descripcion": "Logos, flyers, tarjetas, identidad visual"},
-                {"id": 14, "id_categoria": 4, "nombre": "Marketing Digital", "descripcion": "SEO, redes sociales, MailerLite, campañas"},
-                {"id": 15, "id_categoria": 5, "nombre": "Electrónica", "descripcion": "Microcontroladores, displays, sensores"},
-                {"id": 16, "id_categoria": 5, "nombre": "IoT y DIY", "descripcion": "Arduino, ESP32, LoRa, sistemas HUD para autos"},
-                {"id": 17, "id_categoria": 5, "nombre": "CNC y Mecatrónica", "descripcion": "CNC, IR touch frames, prototipos"},
-                {"id": 18, "id_categoria": 6, "nombre": "Análisis de Datos", "descripcion": "Limpieza, clasificación, reportes inteligentes"},
-                {"id": 19, "id_categoria": 6, "nombre": "Chatbots Multicanal", "descripcion": "Integración AI en WhatsApp, SMS, web"},
-                {"id": 20, "id_categoria": 6, "nombre": "TinyML & ML", "descripcion": "Modelos ligeros para hardware embebido"}
-            ]
-            
-            for serv_data in services_data:
-                service = Service(id=serv_data["id"], id_categoria=serv_data["id_categoria"], 
-                                nombre=serv_data["nombre"], descripcion=serv_data["descripcion"])
-                db.session.add(service)
-            
-            # Create site settings
-            site_settings_data = [
-                {"key": "site_title", "value": "Araiza Inc", "description": "Título del sitio web"},
-                {"key": "site_description", "value": "Soluciones tecnológicas integrales para tu empresa", "description": "Descripción del sitio"},
-                {"key": "company_name", "value": "Araiza Inc", "description": "Nombre de la empresa"},
-                {"key": "company_email", "value": "info@araizainc.com", "description": "Email de contacto"},
-                {"key": "company_phone", "value": "+1 (555) 123-4567", "description": "Teléfono de contacto"},
-                {"key": "company_address", "value": "123 Business Ave, Suite 100, City, State 12345", "description": "Dirección de la empresa"},
-                {"key": "about_us", "value": "Araiza Inc es una empresa líder en soluciones tecnológicas...", "description": "Acerca de nosotros"},
-                {"key": "facebook_url", "value": "https://facebook.com/araizainc", "description": "URL de Facebook"},
-                {"key": "twitter_url", "value": "https://twitter.com/araizainc", "description": "URL de Twitter"},
-                {"key": "linkedin_url", "value": "https://linkedin.com/company/araizainc", "description": "URL de LinkedIn"},
-                {"key": "instagram_url", "value": "https://instagram.com/araizainc", "description": "URL de Instagram"},
-                {"key": "logo_url", "value": "/static/images/logo.png", "description": "URL del logo"},
-                {"key": "hero_title", "value": "Transformamos ideas en soluciones tecnológicas", "description": "Título principal del hero"},
-                {"key": "hero_subtitle", "value": "Expertos en desarrollo, telecomunicaciones, IA y más", "description": "Subtítulo del hero"},
-                {"key": "terms_conditions", "value": "Términos y condiciones de uso...", "description": "Términos y condiciones"},
-                {"key": "privacy_policy", "value": "Política de privacidad...", "description": "Política de privacidad"},
-                {"key": "accessibility", "value": "Declaración de accesibilidad...", "description": "Declaración de accesibilidad"}
-            ]
-            
-            for setting_data in site_settings_data:
-                setting = SiteSettings(key=setting_data["key"], value=setting_data["value"], description=setting_data["description"])
-                db.session.add(setting)
-            
-            # Commit all changes
-            db.session.commit()
+            # Default categories, services and site settings
+            fixtures.load_files([fixtures.DEFAULT_FIXTURE])
             print("✅ Database initialized with default data successfully!")
         else:
             print("✅ Database already contains data")
@@ -110,22 +128,59 @@ def init_database_if_needed():
         db.session.rollback()
         raise
 
+SiteSetting = namedtuple('SiteSetting', 'value updated_at')
+
+def load_site_settings():
+    """Load every site setting in a single query"""
+    return {key: SiteSetting(value, updated_at) for key, value, updated_at in
+            db.session.query(SiteSettings.key, SiteSettings.value, SiteSettings.updated_at)}
+
+site_settings = CachedLoader(load_site_settings, 'settings')
+
 def get_site_setting(key, default=''):
     """Helper function to get site settings"""
-    setting = SiteSettings.query.filter_by(key=key).first()
-    return setting.value if setting else default
+    settings = site_settings.get()
+    return settings[key].value if key in settings else default
+
+def get_setting_updated_at(key):
+    """When a site setting was last changed"""
+    setting = site_settings.get().get(key)
+    return setting.updated_at if setting is not None and setting.updated_at else datetime.utcnow()
+
+MenuEntry = namedtuple('MenuEntry', 'category services')
+MenuCategory = namedtuple('MenuCategory', 'id nombre descripcion')
+MenuService = namedtuple('MenuService', 'id nombre')
+
+def load_categories_menu():
+    """Build the navigation tree with a single joined query"""
+    rows = db.session.query(
+        Category.id, Category.nombre, Category.descripcion, Service.id, Service.nombre
+    ).outerjoin(
+        Service, (Service.id_categoria == Category.id) & (Service.activo == True)
+    ).order_by(Category.id, Service.id)
+    
+    menu = []
+    for cat_id, cat_nombre, cat_descripcion, service_id, service_nombre in rows:
+        if not menu or menu[-1][0].id != cat_id:
+            menu.append((MenuCategory(cat_id, cat_nombre, cat_descripcion), []))
+        if service_id is not None:
+            menu[-1][1].append(MenuService(service_id, service_nombre))
+    return tuple(MenuEntry(category, tuple(services)) for category, services in menu)
+
+categories_menu = CachedLoader(load_categories_menu, 'services')
+
+def latest_update(*models):
+    """Most recent updated_at across the given models"""
+    timestamps = [db.session.query(func.max(model.updated_at)).scalar() for model in models]
+    return max(filter(None, timestamps), default=None)
+
+page_cache.register_timestamp('settings', lambda: latest_update(SiteSettings))
+page_cache.register_timestamp('services', lambda: latest_update(Category, Service))
+page_cache.register_timestamp('portfolio', lambda: latest_update(Portfolio))
 
 def get_categories_with_services():
     """Get categories with their services for navigation"""
-    categories = Category.query.all()
-    categories_with_services = []
-    for category in categories:
-        services = Service.query.filter_by(id_categoria=category.id, activo=True).all()
-        categories_with_services.append({
-            'category': category,
-            'services': services
-        })
-    return categories_with_services
+    return categories_menu.get()
 
 @app.context_processor
 def inject_site_data():
@@ -146,6 +201,7 @@ def inject_site_data():
 
 # Public Routes
 @app.route('/')
+@page_cache.cached('portfolio')
 def index():
     """Home page"""
     categories = Category.query.all()
@@ -160,24 +216,31 @@ def index():
                          hero_subtitle=get_site_setting('hero_subtitle'))
 
 @app.route('/servicios')
+@page_cache.cached(query_args=('categoria',))
 def servicios():
     """Services page"""
     category_id = request.args.get('categoria')
     if category_id:
-        services = Service.query.filter_by(id_categoria=category_id, activo=True).all()
+        services = Service.query.filter_by(id_categoria=category_id, activo=True)
         category = Category.query.get_or_404(category_id)
         selected_category = category
     else:
-        services = Service.query.filter_by(activo=True).all()
+        services = Service.query.filter_by(activo=True)
         selected_category = None
     
     categories = Category.query.all()
+    if app.config['STREAM_TEMPLATES']:
+        return stream_page('servicios.html',
+                           services=LazyRows(services),
+                           categories=categories,
+                           selected_category=selected_category)
     return render_template('servicios.html', 
-                         services=services, 
+                         services=services.all(), 
                          categories=categories,
                          selected_category=selected_category)
 
 @app.route('/servicio/<int:service_id>')
+@page_cache.cached()
 def servicio_detalle(service_id):
     """Service detail page"""
     service = Service.query.get_or_404(service_id)
@@ -185,19 +248,23 @@ def servicio_detalle(service_id):
         Service.id_categoria == service.id_categoria,
         Service.id != service.id,
         Service.activo == True
-    ).limit(3).all()
+    ).order_by(Service.id).limit(3).all()
     
     return render_template('servicio_detalle.html', 
                          service=service,
                          related_services=related_services)
 
 @app.route('/portafolio')
+@page_cache.cached('portfolio')
 def portafolio():
     """Portfolio page"""
-    portfolio_items = Portfolio.query.filter_by(activo=True).all()
-    return render_template('portafolio.html', portfolio_items=portfolio_items)
+    portfolio_items = Portfolio.query.filter_by(activo=True)
+    if app.config['STREAM_TEMPLATES']:
+        return stream_page('portafolio.html', portfolio_items=LazyRows(portfolio_items))
+    return render_template('portafolio.html', portfolio_items=portfolio_items.all())
 
 @app.route('/portafolio/<int:portfolio_id>')
+@page_cache.cached('portfolio')
 def portafolio_detalle(portfolio_id):
     """Portfolio detail page"""
     portfolio_item = Portfolio.query.get_or_404(portfolio_id)
@@ -221,15 +288,18 @@ def contacto_post():
             flash('Por favor complete todos los campos requeridos.', 'error')
             return redirect(url_for('contacto'))
         
-        # Save to database
-        contact = Contact(
+        values = dict(
             nombre=nombre,
             email=email,
             asunto=asunto,
             mensaje=mensaje
         )
-        db.session.add(contact)
-        db.session.commit()
+        if ingest.enabled:
+            # Saved by the next group commit (see ingest.py)
+            ingest.submit(Contact, values)
+        else:
+            db.session.add(Contact(**values))
+            db.session.commit()
         
         flash('¡Gracias por contactarnos! Te responderemos pronto.', 'success')
         return redirect(url_for('contacto'))
@@ -242,7 +312,8 @@ def contacto_post():
 def cotizacion():
     """Quote request page"""
     categories = Category.query.all()
-    return render_template('cotizacion.html', categories=categories)
+    return render_template('cotizacion.html', categories=categories,
+                         catalog_version=tag_version('services'))
 
 @app.route('/cotizacion', methods=['POST'])
 def cotizacion_post():
@@ -263,6 +334,14 @@ def cotizacion_post():
             flash('Por favor complete todos los campos requeridos.', 'error')
             return redirect(url_for('cotizacion'))
         
+        # Checked here so both INGEST_MODEs (see ingest.py) refuse the same ids
+        try:
+            categoria_id = int(categoria_id) if categoria_id else None
+            servicio_id = int(servicio_id) if servicio_id else None
+        except ValueError:
+            flash('Selecciona una categoría y un servicio válidos.', 'error')
+            return redirect(url_for('cotizacion'))
+        
         # Convert date string to date object
         fecha_limite_obj = None
         if fecha_limite:
@@ -271,26 +350,27 @@ def cotizacion_post():
             except ValueError:
                 pass
         
-        # Save to database
-        quote_request = QuoteRequest(
+        values = dict(
             nombre=nombre,
             email=email,
             telefono=telefono,
             empresa=empresa,
-            categoria_id=categoria_id if categoria_id else None,
-            servicio_id=servicio_id if servicio_id else None,
+            categoria_id=categoria_id,
+            servicio_id=servicio_id,
             mensaje=mensaje,
             presupuesto=presupuesto,
             fecha_limite=fecha_limite_obj
         )
-        db.session.add(quote_request)
-        db.session.commit()
-        
-        # Try to add to MailerLite (optional)
-        try:
-            add_to_mailerlite(email, nombre)
-        except:
-            pass  # Continue even if MailerLite fails
+        if ingest.enabled:
+            # The MailerLite subscription is journaled and committed with the row
+            subscription = mailerlite_subscription(email, nombre)
+            ingest.submit(QuoteRequest, values, outbox=[subscription] if subscription else [])
+        else:
+            db.session.add(QuoteRequest(**values))
+            
+            # Queue the MailerLite subscription in the same transaction (optional)
+            enqueue_mailerlite_subscription(email, nombre)
+            db.session.commit()
         
         flash('¡Solicitud de cotización enviada! Te contactaremos pronto.', 'success')
         return redirect(url_for('cotizacion'))
@@ -300,62 +380,124 @@ def cotizacion_post():
         return redirect(url_for('cotizacion'))
 
 @app.route('/api/servicios/<int:categoria_id>')
+@page_cache.cached('services', layout=False)
 def api_servicios_categoria(categoria_id):
     """API endpoint to get services by category"""
-    services = Service.query.filter_by(id_categoria=categoria_id, activo=True).all()
-    return jsonify([{
-        'id': service.id,
-        'nombre': service.nombre,
-        'descripcion': service.descripcion
-    } for service in services])
-
-def add_to_mailerlite(email, name):
-    """Add subscriber to MailerLite"""
-    api_key = os.getenv('MAILERLITE_API_KEY')
-    group_id = os.getenv('MAILERLITE_GROUP_ID')
-    
-    if not api_key:
-        return False
-    
-    url = "https://api.mailerlite.com/api/v2/subscribers"
-    headers = {
-        'X-MailerLite-ApiKey': api_key,
-        'Content-Type': 'application/json'
-    }
-    
-    data = {
-        'email': email,
-        'name': name,
-        'groups': [group_id] if group_id else []
-    }
-    
-    response = requests.post(url, json=data, headers=headers)
-    return response.status_code == 200
+    rows = db.session.execute(
+        select(Service.id, Service.nombre, Service.descripcion)
+        .where(Service.id_categoria == categoria_id, Service.activo.is_(True))
+    )
+    return jsonify([row._asdict() for row in rows])
+
+# Columns the catalogue API can return; id is always included
+CATALOG_FIELDS = {
+    'id': Service.id,
+    'nombre': Service.nombre,
+    'descripcion': Service.descripcion,
+    'precio': Service.precio,
+    'imagen': Service.imagen,
+}
+CATALOG_DEFAULT_FIELDS = ('id', 'nombre')
+CATALOG_MAX_LIMIT = 1000
+
+def _id_list(value):
+    """Parse "1,2,3" into [1, 2, 3]; raise ValueError on anything else"""
+    return [int(item) for item in value.split(',') if item.strip()]
+
+@app.route('/api/catalogo')
+@page_cache.cached('services', layout=False, query_args=('categorias', 'fields', 'limit', 'cursor'))
+def api_catalogo():
+    """Active services of several categories in one compact response
+
+    Query parameters:
+        categorias  comma-separated category ids (default: all)
+        fields      comma-separated columns from CATALOG_FIELDS (default: id,nombre)
+        limit       services per page, up to CATALOG_MAX_LIMIT
+        cursor      the "next" value of the previous page
+
+    Services are returned as arrays in the order of "fields", grouped by
+    category id, e.g. {"fields": ["id", "nombre"], "categorias": {"1":
+    [[3, "Automatización n8n"]]}, "next": null, "version": "..."}. "version"
+    changes whenever the catalogue does, so clients can cache the result.
+    """
+    try:
+        categorias = _id_list(request.args.get('categorias', ''))
+        cursor = int(request.args.get('cursor', 0))
+        limit = int(request.args.get('limit', CATALOG_MAX_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'categorias, cursor y limit deben ser números'}), 400
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    unknown = [field for field in fields if field not in CATALOG_FIELDS]
+    if unknown:
+        return jsonify({'error': f'Campos desconocidos: {", ".join(unknown)}'}), 400
+    fields = ['id'] + [field for field in fields or CATALOG_DEFAULT_FIELDS if field != 'id']
+    limit = max(1, min(limit, CATALOG_MAX_LIMIT))
+
+    # Keyset pagination over the primary key; one extra row tells if there's more
+    query = (select(Service.id_categoria, *(CATALOG_FIELDS[field] for field in fields))
+             .where(Service.activo.is_(True), Service.id > cursor)
+             .order_by(Service.id)
+             .limit(limit + 1))
+    if categorias:
+        query = query.where(Service.id_categoria.in_(categorias))
+    rows = db.session.execute(query).all()
+
+    grouped = {str(categoria_id): [] for categoria_id in categorias}
+    for categoria_id, *values in rows[:limit]:
+        grouped.setdefault(str(categoria_id), []).append(values)
+    return jsonify({
+        'version': tag_version('services'),
+        'fields': fields,
+        'categorias': grouped,
+        'next': str(rows[limit - 1][1]) if len(rows) > limit else None,
+    })
+
+@app.route('/buscar')
+@page_cache.cached('portfolio', query_args=('q',))
+def buscar():
+    """Search results page"""
+    query = request.args.get('q', '').strip()
+    services, projects = search.search(query)
+    return render_template('buscar.html', query=query, services=services, projects=projects)
+
+@app.route('/api/buscar')
+@page_cache.cached('services', 'portfolio', layout=False, query_args=('q', 'limit'))
+def api_buscar():
+    """Typeahead suggestions for the search box"""
+    limit = min(request.args.get('limit', 8, type=int), 20)
+    return jsonify(search.suggest(request.args.get('q', ''), limit=max(limit, 1)))
 
 # About, Terms, Privacy pages
 @app.route('/acerca')
+@page_cache.cached()
 def acerca():
     """About page"""
     about_content = get_site_setting('about_us')
     return render_template('acerca.html', about_content=about_content)
 
 @app.route('/terminos')
+@page_cache.cached()
 def terminos():
     """Terms and conditions page"""
     terms_content = get_site_setting('terms_conditions')
-    return render_template('terminos.html', terms_content=terms_content)
+    return render_template('terminos.html', terms_content=terms_content,
+                         updated_at=get_setting_updated_at('terms_conditions'))
 
 @app.route('/privacidad')
+@page_cache.cached()
 def privacidad():
     """Privacy policy page"""
     privacy_content = get_site_setting('privacy_policy')
-    return render_template('privacidad.html', privacy_content=privacy_content)
+    return render_template('privacidad.html', privacy_content=privacy_content,
+                         updated_at=get_setting_updated_at('privacy_policy'))
 
 @app.route('/accesibilidad')
+@page_cache.cached()
 def accesibilidad():
     """Accessibility page"""
     accessibility_content = get_site_setting('accessibility')
-    return render_template('accesibilidad.html', accessibility_content=accessibility_content)
+    return render_template('accesibilidad.html', accessibility_content=accessibility_content,
+                         updated_at=get_setting_updated_at('accessibility'))
 
 if __name__ == '__main__':
     with app.app_context():
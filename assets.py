@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Fingerprinted, Precompressed Static Assets
+
+The build step minifies static/css/style.css and static/js/main.js, names
+each copy after a hash of its content (static/dist/css/style.<hash>.css),
+and writes .gz (and .br when the brotli package is installed) siblings next
+to it. A manifest maps the source names to the built ones, so templates keep
+calling url_for('static', filename='css/style.css') and get the
+fingerprinted URL. Built files are served precompressed according to
+Accept-Encoding and cached by browsers as immutable.
+
+With --vendor, Bootstrap and Font Awesome (including its webfonts) are
+downloaded into static/vendor and go through the same pipeline; set
+VENDOR_ASSETS=1 to load them from there instead of the CDNs.
+
+Usage:
+    python assets.py build [--vendor]
+"""
+
+from flask import current_app, request, send_from_directory
+from werkzeug.security import safe_join
+from urllib.parse import urljoin
+from cache import CachedLoader, invalidate
+from storage import make_immutable
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import requests
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Source files under static/ that are always built
+SOURCES = ('css/style.css', 'js/main.js')
+
+VENDOR_DIR = 'vendor'
+VENDOR_FILES = {
+    'vendor/bootstrap/css/bootstrap.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/js/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/fontawesome/css/all.min.css':
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+}
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 12
+
+# Fonts and images are already compressed
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ttf', '.eot')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+def minify_js(text):
+    """Drop leading comments and indentation; line breaks are kept for ASI"""
+    lines = []
+    in_comment = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        # Block comments are only looked for at the start of a line, where
+        # they can't be part of a string or a regex
+        while in_comment or stripped.startswith('/*'):
+            end = stripped.find('*/', 0 if in_comment else 2)
+            if end == -1:
+                in_comment, stripped = True, ''
+                break
+            in_comment, stripped = False, stripped[end + 2:].strip()
+        if not stripped or stripped.startswith('//'):
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines) + '\n'
+
+def _css_references(text):
+    """Relative url(...) targets of a stylesheet"""
+    for match in CSS_URL_RE.finditer(text):
+        target = match.group(2).split('?')[0].split('#')[0]
+        if target and not re.match(r'^(data:|[a-z]+://|/)', target):
+            yield target
+
+def vendor(static_folder):
+    """Download the CDN assets (and the files their CSS points to)"""
+    session = requests.Session()
+    fetched = []
+    pending = list(VENDOR_FILES.items())
+    while pending:
+        name, url = pending.pop(0)
+        response = session.get(url, timeout=30)
+        response.raise_for_status()
+        path = os.path.join(static_folder, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as output:
+            output.write(response.content)
+        fetched.append(name)
+
+        if name.endswith('.css'):
+            for target in set(_css_references(response.text)):
+                target_name = os.path.normpath(os.path.join(os.path.dirname(name), target)).replace(os.sep, '/')
+                if target_name not in fetched and all(target_name != queued for queued, _ in pending):
+                    pending.append((target_name, urljoin(url, target)))
+    return fetched
+
+def _sources(static_folder):
+    sources = list(SOURCES)
+    vendor_root = os.path.join(static_folder, VENDOR_DIR)
+    for root, _, files in os.walk(vendor_root):
+        for filename in files:
+            relative = os.path.relpath(os.path.join(root, filename), static_folder)
+            sources.append(relative.replace(os.sep, '/'))
+    # Stylesheets last, so the fonts/images they reference are already hashed
+    return sorted(sources, key=lambda name: name.endswith('.css'))
+
+def _rewrite_css_urls(name, text, manifest):
+    """Point relative url(...) references at their fingerprinted copies"""
+    base = os.path.dirname(name)
+
+    def replace(match):
+        quote, target = match.group(1), match.group(2)
+        path = re.split(r'[?#]', target, maxsplit=1)[0]
+        resolved = os.path.normpath(os.path.join(base, path)).replace(os.sep, '/')
+        if resolved not in manifest:
+            return match.group(0)
+        built = os.path.relpath(manifest[resolved], f'{DIST_DIR}/{base}').replace(os.sep, '/')
+        return f'url({quote}{built}{target[len(path):]}{quote})'
+
+    return CSS_URL_RE.sub(replace, text)
+
+def manifest_target(name, digest):
+    """dist/ path of a built file: css/style.css -> dist/css/style.<hash>.css"""
+    stem, extension = os.path.splitext(name)
+    return f'{DIST_DIR}/{stem}.{digest}{extension}'
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as output:
+        output.write(data)
+    os.replace(tmp_path, path)
+
+def build(static_folder):
+    """Build every asset and write the manifest; return it"""
+    manifest = {}
+    for name in _sources(static_folder):
+        with open(os.path.join(static_folder, *name.split('/')), 'rb') as source:
+            data = source.read()
+
+        minified = '.min.' in name
+        if name.endswith('.css'):
+            text = data.decode('utf-8')
+            text = _rewrite_css_urls(name, text if minified else minify_css(text), manifest)
+            data = text.encode('utf-8')
+        elif name.endswith('.js') and not minified:
+            data = minify_js(data.decode('utf-8')).encode('utf-8')
+
+        target = manifest_target(name, hashlib.sha256(data).hexdigest()[:HASH_LENGTH])
+        path = os.path.join(static_folder, *target.split('/'))
+        _write(path, data)
+        if name.endswith(COMPRESSIBLE):
+            _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write(path + '.br', brotli.compress(data, quality=11))
+        manifest[name] = target
+
+    _write(os.path.join(static_folder, DIST_DIR, MANIFEST),
+           json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as manifest:
+            return json.load(manifest)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def send_static(filename):
+    """Static view that prefers precompressed copies of built assets"""
+    static_folder = current_app.static_folder
+    if not filename.startswith(DIST_DIR + '/'):
+        return current_app.send_static_file(filename)
+
+    response = None
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in ENCODINGS:
+        path = safe_join(static_folder, filename + suffix)
+        if request.accept_encodings[encoding] and path and os.path.isfile(path):
+            response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype)
+            response.content_encoding = encoding
+            break
+    if response is None:
+        response = current_app.send_static_file(filename)
+    response.vary.add('Accept-Encoding')
+    return make_immutable(response)
+
+def init_app(app):
+    app.config.setdefault('VENDOR_ASSETS', False)
+    # Reloaded after `python assets.py build`, which invalidates 'assets'
+    manifest = CachedLoader(lambda: load_manifest(app.static_folder), 'assets')
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint != 'static':
+            return
+        built = manifest.get()
+        if values.get('filename') in built:
+            values['filename'] = built[values['filename']]
+
+    @app.context_processor
+    def inject_vendor_assets():
+        return {'vendor_assets': app.config['VENDOR_ASSETS']}
+
+    app.view_functions['static'] = send_static
+
+if __name__ == '__main__':
+    import sys
+    from app import app
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print(__doc__)
+        sys.exit(1)
+
+    with app.app_context():
+        static_folder = app.static_folder
+        if '--vendor' in sys.argv:
+            print("📥 Downloading vendor assets...")
+            for name in vendor(static_folder):
+                print(f"   {name}")
+        manifest = build(static_folder)
+        for name, target in manifest.items():
+            print(f"🔨 {name} -> {target}")
+        # Cached pages still point at the previous fingerprints
+        invalidate('assets')
+    if brotli is None:
+        print("ℹ️  brotli not installed: only .gz copies were written")
+    print(f"✅ Built {len(manifest)} assets")
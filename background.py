@@ -0,0 +1,27 @@
+"""Background threads of the processes that serve the site.
+
+A thread started when app.py is imported would also run in every script
+that imports it (init_db.py, counters.py, fixtures.py...) and in the parent
+of the debug reloader, and it would be missing from gunicorn workers forked
+after the import (``--preload``), since threads don't survive a fork.
+Starters registered here run on the first request each process serves.
+"""
+import os
+import threading
+
+
+def on_first_request(app, start, *args):
+    """Call ``start(*args)`` once in every process, before its first request"""
+    started = {'pid': None}
+    lock = threading.Lock()
+
+    def start_once():
+        if started['pid'] == os.getpid():
+            return
+        with lock:
+            if started['pid'] == os.getpid():
+                return
+            started['pid'] = os.getpid()
+        start(*args)
+
+    app.before_request(start_once)
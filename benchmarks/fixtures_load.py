@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Fixture Load Benchmark
+
+Writes a synthetic catalogue fixture (JSONL: categories, services and
+portfolio projects with accented Spanish words) and times fixtures.load_files
+on a throwaway database with the search index installed:
+
+    load     every row into the new database
+    reload   the same file again (every row is an update)
+    update   a smaller file renaming a slice of the services, into the
+             loaded catalogue
+
+Each load is one transaction and includes the search index and counter
+refresh. The search tables are checked against the active rows after each
+load.
+
+Usage:
+    python benchmarks/fixtures_load.py [--rows 1000000] [--update 10000]
+        [--dir /var/tmp]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+WORDS = [
+    'automatización', 'desarrollo', 'aplicación', 'integración', 'telefonía',
+    'diseño', 'análisis', 'electrónica', 'inteligencia', 'artificial',
+    'migración', 'configuración', 'publicidad', 'reservación', 'operación',
+    'web', 'móvil', 'servidor', 'nube', 'datos', 'seguridad', 'red', 'voz',
+    'chatbot', 'campaña', 'logística', 'facturación', 'inventario', 'sensores',
+]
+
+CATEGORIES = 50
+
+def phrase(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def write_fixture(path, rows, rng, first=1, prefix=''):
+    """Write `rows` services (and a project per ten) starting at id `first`"""
+    with open(path, 'w', encoding='utf-8') as fixture:
+        def write(table, row):
+            fixture.write(json.dumps({'_table': table, **row}, ensure_ascii=False) + '\n')
+
+        for category_id in range(1, CATEGORIES + 1):
+            write('categories', {'id': category_id, 'nombre': f'Categoría {category_id}'})
+        for service_id in range(first, first + rows):
+            write('services', {'id': service_id, 'id_categoria': rng.randint(1, CATEGORIES),
+                               'nombre': (prefix + phrase(rng, 3)).capitalize(),
+                               'descripcion': phrase(rng, 20), 'activo': rng.random() < 0.95})
+            if service_id % 10 == 0:
+                write('portfolio', {'id': service_id // 10, 'titulo': phrase(rng, 3).capitalize(),
+                                    'descripcion': phrase(rng, 30),
+                                    'tecnologias': 'Flask, Python, SQLite', 'activo': True})
+    return os.path.getsize(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='services in the fixture')
+    parser.add_argument('--update', type=int, default=10000, help='services renamed by the update load')
+    parser.add_argument('--dir', default=None, help='directory for the database and fixtures')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(dir=args.dir)
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(tmp, "bench.db")}'
+    os.environ['PAGE_CACHE_BACKEND'] = 'none'
+    os.environ['OUTBOX_WORKER'] = 'none'
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+    from sqlalchemy import text
+    from app import app
+    from migrations import upgrade_database
+    from models import db
+    import fixtures
+
+    app.instance_path = tmp
+    rng = random.Random(42)
+    catalogue = os.path.join(tmp, 'catalogue.jsonl')
+    update = os.path.join(tmp, 'update.jsonl')
+    print(f"🔨 Writing {args.rows:,} services and {args.rows // 10:,} projects...")
+    sizes = {
+        catalogue: write_fixture(catalogue, args.rows, rng),
+        # Spread over the catalogue, so the renamed rows aren't all at the end
+        update: write_fixture(update, args.update, rng, first=args.rows // 3, prefix='nuevo '),
+    }
+
+    def check():
+        with db.engine.connect() as connection:
+            for source, table in (('services', 'search_services'), ('services', 'search_services_names'),
+                                  ('portfolio', 'search_portfolio'), ('portfolio', 'search_portfolio_names')):
+                active = connection.execute(text(f"SELECT count(*) FROM {source} WHERE activo")).scalar()
+                indexed = connection.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+                if active != indexed:
+                    sys.exit(f"❌ {table} has {indexed:,} rows for {active:,} active {source}")
+            renamed = connection.execute(text(
+                "SELECT count(*) FROM search_services_names WHERE search_services_names MATCH 'nuevo'")).scalar()
+        return renamed
+
+    with app.app_context():
+        db.create_all()
+        # Creates the (empty) search tables and triggers
+        upgrade_database()
+
+        print(f"\n{'load':<8} {'rows':>10} {'MB':>8} {'seconds':>9} {'rows/s':>10}")
+        for name, path in (('load', catalogue), ('reload', catalogue), ('update', update)):
+            started = time.perf_counter()
+            counts = fixtures.load_files([path])
+            elapsed = time.perf_counter() - started
+            rows = sum(counts.values())
+            renamed = check()
+            print(f"{name:<8} {rows:>10,} {sizes[path] / 2 ** 20:>8.1f} {elapsed:>9.2f} {rows / elapsed:>10,.0f}"
+                  f"   ({renamed:,} renamed names indexed)")
+
+if __name__ == '__main__':
+    main()
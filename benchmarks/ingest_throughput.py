@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Form Submission Throughput: Direct Commits vs. the Ingest Journal
+
+Posts contact and quote forms from several client threads against a
+throwaway database, once with INGEST_MODE=direct (a transaction per
+submission) and once with INGEST_MODE=journal (journal + group commit, see
+ingest.py), each in a fresh process. Reports accepted submissions per
+second, p50/p95/p99 request latency, how long after the burst every row was
+in the database, and how many submissions were lost (e.g. "database is
+locked").
+
+Put the database on the disk the site will use (--dir): on tmpfs fsyncs
+are free and the direct path looks much better than it is.
+
+Usage:
+    python benchmarks/ingest_throughput.py [--submissions 2000]
+        [--concurrency 8] [--fsync] [--dir /var/tmp]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MODES = ('direct', 'journal')
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run(mode, submissions, concurrency, directory):
+    """Measure one mode in this process; return its numbers"""
+    tmp = tempfile.mkdtemp(dir=directory)
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(tmp, "bench.db")}'
+    os.environ['INGEST_MODE'] = mode
+    os.environ['INGEST_DIR'] = os.path.join(tmp, 'ingest')
+    os.environ['OUTBOX_WORKER'] = 'none'
+    os.environ['PAGE_CACHE_BACKEND'] = 'none'
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+    from app import app, init_database_if_needed
+    from models import db, Contact, QuoteRequest
+
+    app.instance_path = tmp
+    with app.app_context():
+        init_database_if_needed()
+
+    def submit(index):
+        # One client per submission: test clients aren't shared across threads
+        client = app.test_client(use_cookies=False)
+        if index % 2:
+            path, data = '/contacto', {'nombre': f'Contacto {index}', 'email': 'k@example.com',
+                                       'asunto': 'Hola', 'mensaje': 'Mensaje de prueba'}
+        else:
+            path, data = '/cotizacion', {'nombre': f'Cliente {index}', 'email': 'c@example.com',
+                                         'categoria_id': '1', 'mensaje': 'Necesito una cotización'}
+        started = time.perf_counter()
+        client.post(path, data=data)
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(submit, range(-concurrency * 4, 0)))  # warm-up
+        started = time.perf_counter()
+        timings = list(executor.map(submit, range(submissions)))
+        elapsed = time.perf_counter() - started
+
+    def stored():
+        with app.app_context():
+            return Contact.query.count() + QuoteRequest.query.count()
+
+    # Warm-up rows plus measured ones; wait for the journal to drain
+    expected = submissions + concurrency * 4
+    deadline = time.perf_counter() + 30
+    while stored() < expected and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    durable = time.perf_counter() - started
+    return {
+        'mode': mode,
+        'submissions': submissions,
+        'per_second': round(submissions / elapsed, 1),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'all_stored_s': round(durable, 2),
+        'lost': expected - stored(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--submissions', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads')
+    parser.add_argument('--fsync', action='store_true', help='INGEST_FSYNC=1 for the journal')
+    parser.add_argument('--dir', help='where to create the database (default: system temp dir)')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # Child process: print the numbers of one mode as JSON
+        print(json.dumps(run(args.mode, args.submissions, args.concurrency, args.dir)))
+        return
+
+    print(f"📊 {args.submissions:,} submissions from {args.concurrency} threads"
+          + (" (journal fsync on)" if args.fsync else ""))
+    env = dict(os.environ, INGEST_FSYNC='1' if args.fsync else '0')
+    for mode in MODES:
+        command = [sys.executable, os.path.abspath(__file__), '--mode', mode,
+                   '--submissions', str(args.submissions), '--concurrency', str(args.concurrency)]
+        if args.dir:
+            command += ['--dir', args.dir]
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        numbers = json.loads(output.strip().splitlines()[-1])
+        print(f"  {mode:8} {numbers['per_second']:8.1f} subm/s   p50 {numbers['p50_ms']:7.2f} ms   "
+              f"p95 {numbers['p95_ms']:7.2f} ms   p99 {numbers['p99_ms']:7.2f} ms   "
+              f"all stored after {numbers['all_stored_s']:.2f}s"
+              + (f"   ❌ {numbers['lost']} lost" if numbers['lost'] else ''))
+
+if __name__ == '__main__':
+    main()
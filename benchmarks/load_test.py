@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Load Test for the Public Site and the Admin
+
+Seeds a throwaway database at the chosen scale (categories, services,
+portfolio projects, quote requests and contacts), then drives the app
+in-process through the Flask test client and/or through a real threaded
+WSGI server over HTTP, and reports throughput and p50/p95/p99 latency per
+route. Routes that answered any request with an error status get no
+latency numbers (error pages are not comparable timings); they are listed
+apart and the run exits with status 1. Results are saved as JSON; pass a
+previous file as --baseline to print the change of every number and exit
+with status 1 when any route got slower (p95) or slower to serve (req/s)
+by more than --tolerance.
+
+Usage:
+    python benchmarks/load_test.py [--scale 1000] [--requests 200]
+        [--mode inprocess|wsgi|both] [--concurrency 4]
+        [--page-cache memory|none] [--output results.json]
+        [--baseline baseline.json] [--tolerance 0.2]
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+QUOTE_STATES = (['pendiente', 'en_proceso', 'completada', 'cancelada'], [1, 2, 20, 5])
+CONTACT_STATES = (['nuevo', 'leido', 'respondido', 'cerrado'], [1, 5, 20, 20])
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def seed(scale, rng):
+    """Synthetic rows on top of the default content; returns the ids to request"""
+    from sqlalchemy import insert
+    from models import db, Category, Service, Portfolio, QuoteRequest, Contact
+    from counters import rebuild_counters
+
+    start = datetime(2020, 1, 1)
+    with db.engine.begin() as connection:
+        connection.execute(insert(Category.__table__), [
+            {'nombre': f'Categoría {i}', 'descripcion': 'Categoría sintética',
+             'created_at': start, 'updated_at': start}
+            for i in range(max(1, scale // 100))
+        ])
+        category_ids = [row[0] for row in connection.execute(db.select(Category.id))]
+        connection.execute(insert(Service.__table__), [
+            {'id_categoria': rng.choice(category_ids), 'nombre': f'Servicio {i}',
+             'descripcion': 'Servicio sintético para pruebas de carga', 'precio': 'Desde $1,000',
+             'activo': rng.random() < 0.9, 'created_at': start + timedelta(minutes=i),
+             'updated_at': start + timedelta(minutes=i)}
+            for i in range(scale)
+        ])
+        connection.execute(insert(Portfolio.__table__), [
+            {'titulo': f'Proyecto {i}', 'descripcion': 'Proyecto sintético', 'cliente': f'Cliente {i}',
+             'tecnologias': 'Flask, Python, SQLite', 'activo': rng.random() < 0.5,
+             'created_at': start + timedelta(hours=i), 'updated_at': start + timedelta(hours=i)}
+            for i in range(max(1, scale // 10))
+        ])
+        connection.execute(insert(QuoteRequest.__table__), [
+            {'nombre': f'Cliente {i}', 'email': f'c{i}@example.com', 'mensaje': 'Hola',
+             'categoria_id': rng.choice(category_ids),
+             'estado': rng.choices(*QUOTE_STATES)[0], 'created_at': start + timedelta(minutes=i)}
+            for i in range(scale * 2)
+        ])
+        connection.execute(insert(Contact.__table__), [
+            {'nombre': f'Contacto {i}', 'email': f'k{i}@example.com', 'mensaje': 'Hola',
+             'estado': rng.choices(*CONTACT_STATES)[0], 'created_at': start + timedelta(minutes=i)}
+            for i in range(scale * 2)
+        ])
+        service_ids = [row[0] for row in connection.execute(
+            db.select(Service.id).where(Service.activo.is_(True)))]
+    # Bulk inserts skip the ORM events that keep the counters current
+    rebuild_counters()
+    return category_ids, service_ids
+
+def make_cases(rng, category_ids, service_ids):
+    """Route name -> function returning (method, path, form data)"""
+    def quote():
+        return 'POST', '/cotizacion', {
+            'nombre': 'Cliente de prueba', 'email': 'prueba@example.com',
+            'categoria_id': str(rng.choice(category_ids)), 'mensaje': 'Necesito una cotización',
+        }
+
+    return {
+        'index': lambda: ('GET', '/', None),
+        'servicios': lambda: ('GET', '/servicios', None),
+        'servicio_detalle': lambda: ('GET', f'/servicio/{rng.choice(service_ids)}', None),
+        'api_servicios_categoria': lambda: ('GET', f'/api/servicios/{rng.choice(category_ids)}', None),
+        'cotizacion_post': quote,
+        'admin.dashboard': lambda: ('GET', '/admin/', None),
+        'admin.cotizaciones': lambda: ('GET', '/admin/cotizaciones?estado='
+                                       + rng.choice(['todas', 'pendiente', 'completada']), None),
+    }
+
+def summarize(timings, elapsed, statuses):
+    errors = [status for status in statuses if status >= 400]
+    if errors:
+        return {
+            'requests': len(timings),
+            'errors': len(errors),
+            'statuses': {str(status): errors.count(status) for status in sorted(set(errors))},
+        }
+    return {
+        'requests': len(timings),
+        'errors': 0,
+        'rps': round(len(timings) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+    }
+
+def run_inprocess(app, cases, requests):
+    # No cookies: the flash message of a POST would make later GETs bypass the page cache
+    client = app.test_client(use_cookies=False)
+    results = {}
+    for name, make_request in cases.items():
+        for _ in range(min(20, requests)):
+            method, path, data = make_request()
+            client.open(path, method=method, data=data)
+        timings, statuses = [], []
+        started = time.perf_counter()
+        for _ in range(requests):
+            method, path, data = make_request()
+            request_started = time.perf_counter()
+            response = client.open(path, method=method, data=data)
+            response.get_data()
+            timings.append((time.perf_counter() - request_started) * 1000)
+            statuses.append(response.status_code)
+        results[name] = summarize(timings, time.perf_counter() - started, statuses)
+    return results
+
+def run_wsgi(app, cases, requests, concurrency):
+    from werkzeug.serving import make_server
+
+    # One log line per request would cost more than some of the routes
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def send(request):
+        method, path, data = request
+        body = urlencode(data) if data else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if data else {}
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=30)
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        finally:
+            connection.close()
+        return (time.perf_counter() - started) * 1000, status
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for name, make_request in cases.items():
+                # Draw the random requests up front, outside the client threads
+                warmup = [make_request() for _ in range(min(20, requests))]
+                batch = [make_request() for _ in range(requests)]
+                list(executor.map(send, warmup))
+                started = time.perf_counter()
+                answers = list(executor.map(send, batch))
+                elapsed = time.perf_counter() - started
+                results[name] = summarize([ms for ms, _ in answers], elapsed,
+                                          [status for _, status in answers])
+    finally:
+        server.shutdown()
+    return results
+
+def compare(results, baseline, tolerance):
+    """Print the change against a baseline; return the regressions found"""
+    regressions = []
+    for mode, routes in results['results'].items():
+        for name, current in routes.items():
+            before = baseline.get('results', {}).get(mode, {}).get(name)
+            if not before or current['errors'] or before['errors']:
+                continue
+            p95 = (current['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+            rps = (current['rps'] - before['rps']) / before['rps'] if before['rps'] else 0.0
+            flag = ''
+            if p95 > tolerance or rps < -tolerance:
+                flag = '  ❌ regresión'
+                regressions.append(f'{mode}/{name}')
+            print(f"  {mode:9} {name:24} p95 {before['p95_ms']:8.2f} → {current['p95_ms']:8.2f} ms ({p95:+.0%})"
+                  f"   req/s {before['rps']:8.1f} → {current['rps']:8.1f} ({rps:+.0%}){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=1000, help='services; other tables scale with it')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per route')
+    parser.add_argument('--mode', choices=['inprocess', 'wsgi', 'both'], default='both')
+    parser.add_argument('--concurrency', type=int, default=4, help='client threads in wsgi mode')
+    parser.add_argument('--page-cache', choices=['memory', 'none'], default='memory')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(tmp, "bench.db")}'
+    os.environ['PAGE_CACHE_BACKEND'] = args.page_cache
+    os.environ['OUTBOX_WORKER'] = 'none'
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+    from app import app, init_database_if_needed
+
+    app.instance_path = tmp
+    rng = random.Random(args.seed)
+    with app.app_context():
+        init_database_if_needed()
+        print(f"🔨 Seeding {args.scale:,} services, {args.scale * 2:,} quotes and contacts...")
+        category_ids, service_ids = seed(args.scale, rng)
+    cases = make_cases(rng, category_ids, service_ids)
+
+    results = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': args.scale,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'page_cache': args.page_cache,
+        },
+        'results': {},
+    }
+    modes = ['inprocess', 'wsgi'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        print(f"\n📊 {mode}")
+        if mode == 'inprocess':
+            routes = run_inprocess(app, cases, args.requests)
+        else:
+            routes = run_wsgi(app, cases, args.requests, args.concurrency)
+        results['results'][mode] = routes
+        for name, numbers in routes.items():
+            if not numbers['errors']:
+                print(f"  {name:24} {numbers['rps']:8.1f} req/s   p50 {numbers['p50_ms']:7.2f} ms   "
+                      f"p95 {numbers['p95_ms']:7.2f} ms   p99 {numbers['p99_ms']:7.2f} ms")
+        failed = {name: numbers for name, numbers in routes.items() if numbers['errors']}
+        if failed:
+            print("  ❌ Con errores (sin latencias):")
+            for name, numbers in failed.items():
+                statuses = ', '.join(f'{count}× {status}' for status, count in numbers['statuses'].items())
+                print(f"  {name:24} {numbers['errors']}/{numbers['requests']} errores ({statuses})")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+
+    failed = sorted({f'{mode}/{name}' for mode, routes in results['results'].items()
+                     for name, numbers in routes.items() if numbers['errors']})
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            print(f"\n📊 Comparación con {args.baseline}")
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regresiones: {', '.join(regressions)}")
+    if failed:
+        print(f"❌ {len(failed)} rutas con errores: {', '.join(failed)}")
+    if failed or regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
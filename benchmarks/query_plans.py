@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Query Plan Benchmark for the Hot Filter/Sort Columns
+
+Seeds a throwaway SQLite database with synthetic rows, then runs the admin
+listing and public catalogue queries twice: once without the indexes declared
+in models.py and once after migrations.add_missing_indexes() has created
+them. For each query it prints the SQLite query plan and the median time.
+
+Usage:
+    python benchmarks/query_plans.py [--rows 100000] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import create_engine, insert, text
+from models import db, Category, Service, Portfolio, QuoteRequest, Contact
+from migrations import add_missing_indexes
+
+QUERIES = {
+    'cotizaciones (todas)':
+        "SELECT * FROM quote_requests ORDER BY created_at DESC LIMIT 20",
+    'cotizaciones (pendiente)':
+        "SELECT * FROM quote_requests WHERE estado = 'pendiente' ORDER BY created_at DESC LIMIT 20",
+    'contactos (nuevo)':
+        "SELECT * FROM contacts WHERE estado = 'nuevo' ORDER BY created_at DESC LIMIT 20",
+    'contactos pendientes (count)':
+        "SELECT count(*) FROM contacts WHERE estado = 'nuevo'",
+    'servicios por categoria':
+        "SELECT * FROM services WHERE id_categoria = 3 AND activo = 1",
+    'portafolio activo':
+        "SELECT * FROM portfolio WHERE activo = 1 LIMIT 3",
+}
+
+def seed(connection, rows):
+    rng = random.Random(42)
+    start = datetime(2020, 1, 1)
+    categories = max(6, rows // 1000)
+
+    connection.execute(insert(Category.__table__), [
+        {'id': i, 'nombre': f'Categoría {i}'} for i in range(1, categories + 1)
+    ])
+    connection.execute(insert(Service.__table__), [
+        {'id_categoria': rng.randint(1, categories), 'nombre': f'Servicio {i}',
+         'descripcion': 'Servicio sintético', 'activo': rng.random() < 0.9,
+         'created_at': start + timedelta(minutes=i)}
+        for i in range(rows)
+    ])
+    connection.execute(insert(Portfolio.__table__), [
+        {'titulo': f'Proyecto {i}', 'activo': rng.random() < 0.02,
+         'created_at': start + timedelta(minutes=i)}
+        for i in range(rows)
+    ])
+    connection.execute(insert(QuoteRequest.__table__), [
+        {'nombre': f'Cliente {i}', 'email': f'c{i}@example.com', 'mensaje': 'Hola',
+         'estado': rng.choices(['pendiente', 'en_proceso', 'completada', 'cancelada'], [1, 2, 20, 5])[0],
+         'created_at': start + timedelta(minutes=i)}
+        for i in range(rows)
+    ])
+    connection.execute(insert(Contact.__table__), [
+        {'nombre': f'Contacto {i}', 'email': f'k{i}@example.com', 'mensaje': 'Hola',
+         'estado': rng.choices(['nuevo', 'leido', 'respondido', 'cerrado'], [1, 5, 20, 20])[0],
+         'created_at': start + timedelta(minutes=i)}
+        for i in range(rows)
+    ])
+
+def drop_indexes(connection):
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            connection.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+    connection.execute(text('ANALYZE'))
+
+def measure(connection, repeat):
+    results = {}
+    for name, sql in QUERIES.items():
+        plan = [row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            connection.execute(text(sql)).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = (plan, statistics.median(timings))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{os.path.join(tmp, "bench.db")}')
+        with engine.begin() as connection:
+            db.metadata.create_all(connection)
+            print(f"🔨 Seeding {args.rows:,} rows per table...")
+            seed(connection, args.rows)
+
+        with engine.begin() as connection:
+            drop_indexes(connection)
+            before = measure(connection, args.repeat)
+            add_missing_indexes(connection)
+            after = measure(connection, args.repeat)
+
+    for name in QUERIES:
+        (plan_before, ms_before), (plan_after, ms_after) = before[name], after[name]
+        print(f"\n{name}")
+        print(f"  sin índices: {ms_before:8.2f} ms  {' | '.join(plan_before)}")
+        print(f"  con índices: {ms_after:8.2f} ms  {' | '.join(plan_after)}")
+        if ms_after:
+            print(f"  mejora: {ms_before / ms_after:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Search Latency Benchmark
+
+Seeds a throwaway database with a synthetic catalogue (services, categories
+and portfolio projects with accented Spanish words), then times the
+/api/buscar typeahead endpoint through the Flask test client with the page
+cache disabled, plus the queries behind the /buscar page (without the
+layout, whose menu lists every service), and prints p50/p95/p99.
+
+Usage:
+    python benchmarks/search_latency.py [--rows 100000] [--requests 2000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+WORDS = [
+    'automatización', 'desarrollo', 'aplicación', 'integración', 'telefonía',
+    'diseño', 'análisis', 'electrónica', 'inteligencia', 'artificial',
+    'migración', 'configuración', 'publicidad', 'reservación', 'operación',
+    'web', 'móvil', 'servidor', 'nube', 'datos', 'seguridad', 'red', 'voz',
+    'chatbot', 'campaña', 'logística', 'facturación', 'inventario', 'sensores',
+]
+
+# The most frequent words of any Spanish text; visitors don't search for them
+STOPWORDS = ['de', 'la', 'el', 'y', 'en', 'para', 'con', 'los', 'las', 'del', 'un', 'una', 'que', 'por']
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+SYLLABLES = ['ca', 'de', 'li', 'mo', 'nu', 'ra', 'se', 'ti', 'vo', 'za', 'ción', 'tér', 'pli', 'gra', 'fón']
+
+def vocabulary(rng, size=5000):
+    """Catalogue-like vocabulary, most frequent first: stopwords, then the
+    known words and many rarer ones in random order"""
+    words = set(WORDS)
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words - set(STOPWORDS))
+    rng.shuffle(words)
+    return STOPWORDS + words
+
+def word(rng, vocab):
+    """Zipf-like pick: a few words are common, most are rare"""
+    if rng.random() < 0.5:
+        return vocab[min(len(vocab) - 1, int(rng.paretovariate(1.2)) - 1)]
+    return rng.choice(vocab)
+
+def term(rng, vocab):
+    """A word a visitor would search for"""
+    while True:
+        picked = word(rng, vocab)
+        if picked not in STOPWORDS:
+            return picked
+
+def phrase(rng, vocab, words):
+    return ' '.join(word(rng, vocab) for _ in range(words))
+
+def fold(rng, word):
+    """What a visitor types: no accents, often only the beginning"""
+    plain = word.translate(str.maketrans('áéíóúñ', 'aeioun'))
+    return plain[:rng.randint(3, len(plain))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(tmp, "bench.db")}'
+    os.environ['PAGE_CACHE_BACKEND'] = 'none'
+    os.environ['OUTBOX_WORKER'] = 'none'
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+    from sqlalchemy import insert
+    from app import app
+    from migrations import upgrade_database
+    from models import db, Category, Service, Portfolio
+    import search
+
+    app.instance_path = tmp
+    rng = random.Random(42)
+    vocab = vocabulary(rng)
+    now = datetime.utcnow()
+    with app.app_context():
+        db.create_all()
+        print(f"🔨 Seeding {args.rows:,} services and {args.rows // 10:,} projects...")
+        with db.engine.begin() as connection:
+            connection.execute(insert(Category.__table__), [
+                {'id': i, 'nombre': f'Categoría {phrase(rng, vocab, 2)}', 'created_at': now, 'updated_at': now}
+                for i in range(1, 51)
+            ])
+            connection.execute(insert(Service.__table__), [
+                {'id_categoria': rng.randint(1, 50), 'nombre': phrase(rng, vocab, 3).capitalize(),
+                 'descripcion': phrase(rng, vocab, 25), 'activo': rng.random() < 0.95,
+                 'created_at': now, 'updated_at': now}
+                for _ in range(args.rows)
+            ])
+            connection.execute(insert(Portfolio.__table__), [
+                {'titulo': phrase(rng, vocab, 3).capitalize(), 'descripcion': phrase(rng, vocab, 40),
+                 'tecnologias': 'Flask, Python, SQLite', 'activo': True,
+                 'created_at': now, 'updated_at': now}
+                for _ in range(args.rows // 10)
+            ])
+        # Creates the FTS tables and indexes the rows seeded above
+        upgrade_database()
+
+    client = app.test_client()
+
+    def request_api(query):
+        response = client.get(f'/api/buscar?q={query}')
+        assert response.status_code == 200, query
+
+    def search_page(query):
+        with app.test_request_context():
+            search.search(query)
+
+    cases = {
+        '/api/buscar (1 palabra)': (request_api, lambda: fold(rng, term(rng, vocab))),
+        '/api/buscar (2 palabras)': (request_api, lambda: f'{term(rng, vocab)}+{fold(rng, term(rng, vocab))}'),
+        'search() de /buscar': (search_page, lambda: fold(rng, term(rng, vocab))),
+    }
+    for name, (run, make_query) in cases.items():
+        for _ in range(50):
+            run(make_query())
+        timings = []
+        for _ in range(args.requests):
+            query = make_query()
+            started = time.perf_counter()
+            run(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"{name:28} p50 {statistics.median(timings):6.2f} ms   "
+              f"p95 {percentile(timings, 0.95):6.2f} ms   p99 {percentile(timings, 0.99):6.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+SQLite Concurrency Stress Test: Reads During Writes
+
+Runs reader and writer processes (like gunicorn workers) against one
+throwaway database for a few seconds, first with the settings the site used
+before sqlite_tuning.py (rollback journal, synchronous=FULL, small cache)
+and then with the tuned profile (WAL and the rest of the defaults).
+Writers run admin-style transactions: a bulk status change of up to 500
+quote requests plus an import of --batch contacts. Readers run the queries
+of the public pages and the dashboard. For each profile it reports read latency
+p50/p99/max, reads and writes per second, and "database is locked" errors.
+With a rollback journal, a write transaction that outgrows the page cache,
+and every commit, stops all readers until it finishes; in WAL mode readers
+keep going. On a single CPU the processes also wait for each other, so
+compare p99 rather than the median.
+
+Usage:
+    python benchmarks/sqlite_concurrency.py [--seconds 5] [--readers 3]
+        [--writers 2] [--batch 20000] [--hold-ms 0] [--rows 20000]
+        [--dir /var/tmp]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+PROFILES = {
+    'legacy': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': '0',
+               'SQLITE_CACHE_SIZE_KB': '2000', 'SQLITE_TEMP_STORE': 'DEFAULT'},
+    'tuned': {},
+}
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def _app(database, profile):
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    os.environ['OUTBOX_WORKER'] = 'none'
+    os.environ['SQLITE_MAINTENANCE_INTERVAL'] = '0'
+    os.environ.update(PROFILES[profile])
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from app import app
+    return app
+
+def seed(database, profile, rows):
+    from sqlalchemy import insert
+    from datetime import datetime, timedelta
+
+    app = _app(database, profile)
+    from app import init_database_if_needed
+    from models import db, Service, QuoteRequest, Contact
+    from counters import rebuild_counters
+
+    start = datetime(2020, 1, 1)
+    with app.app_context():
+        init_database_if_needed()
+        with db.engine.begin() as connection:
+            connection.execute(insert(Service.__table__), [
+                {'id_categoria': 1 + i % 4, 'nombre': f'Servicio {i}', 'descripcion': 'Servicio sintético',
+                 'activo': True, 'created_at': start, 'updated_at': start}
+                for i in range(rows // 100)
+            ])
+            connection.execute(insert(QuoteRequest.__table__), [
+                {'nombre': f'Cliente {i}', 'email': f'c{i}@example.com', 'mensaje': 'Hola',
+                 'estado': 'pendiente', 'created_at': start + timedelta(minutes=i)}
+                for i in range(rows)
+            ])
+            connection.execute(insert(Contact.__table__), [
+                {'nombre': f'Contacto {i}', 'email': f'k{i}@example.com', 'mensaje': 'Hola',
+                 'estado': 'nuevo', 'created_at': start + timedelta(minutes=i)}
+                for i in range(rows)
+            ])
+        rebuild_counters()
+
+def reader(database, profile, seconds, results):
+    from sqlalchemy.exc import OperationalError
+    app = _app(database, profile)
+    from app import load_categories_menu
+    from models import db, Service
+    from counters import dashboard_stats
+
+    timings, errors = [], 0
+    rng = random.Random(os.getpid())
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                load_categories_menu()
+                Service.query.filter_by(id_categoria=rng.randint(1, 4), activo=True).limit(50).all()
+                dashboard_stats()
+            except OperationalError:
+                errors += 1
+            db.session.rollback()
+            timings.append((time.perf_counter() - started) * 1000)
+    results.put(('read', timings, errors))
+
+def writer(database, profile, seconds, hold, rows, batch, results):
+    from sqlalchemy import insert, update
+    from sqlalchemy.exc import OperationalError
+    app = _app(database, profile)
+    from models import db, QuoteRequest, Contact
+    from counters import adjust, counter_name
+
+    timings, errors = [], 0
+    rng = random.Random(os.getpid())
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            old, new = rng.sample(['pendiente', 'en_proceso'], 2)
+            first = rng.randint(1, rows)
+            try:
+                with db.engine.begin() as connection:
+                    changed = connection.execute(update(QuoteRequest.__table__)
+                                                 .where(QuoteRequest.id.between(first, first + 500),
+                                                        QuoteRequest.estado == old)
+                                                 .values(estado=new)).rowcount
+                    adjust(connection, {counter_name('quote_requests', 'estado', old): -changed,
+                                        counter_name('quote_requests', 'estado', new): changed})
+                    connection.execute(insert(Contact.__table__), [
+                        {'nombre': 'Burst', 'email': 'b@example.com', 'mensaje': 'Mensaje importado ' * 10,
+                         'estado': 'nuevo'}
+                        for _ in range(batch)
+                    ])
+                    adjust(connection, {counter_name('contacts'): batch,
+                                        counter_name('contacts', 'estado', 'nuevo'): batch})
+                    # The rest of the request (rendering, images...) before the commit
+                    time.sleep(hold)
+            except OperationalError:
+                errors += 1
+            timings.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.01)
+    results.put(('write', timings, errors))
+
+def run(profile, args):
+    database = os.path.join(tempfile.mkdtemp(dir=args.dir), 'stress.db')
+    context = multiprocessing.get_context('spawn')
+    process = context.Process(target=seed, args=(database, profile, args.rows))
+    process.start()
+    process.join()
+
+    results = context.Queue()
+    workers = ([context.Process(target=reader, args=(database, profile, args.seconds, results))
+                for _ in range(args.readers)]
+               + [context.Process(target=writer, args=(database, profile, args.seconds, args.hold_ms / 1000,
+                                                        args.rows, args.batch, results))
+                  for _ in range(args.writers)])
+    for worker in workers:
+        worker.start()
+    collected = {'read': ([], 0), 'write': ([], 0)}
+    for _ in workers:
+        kind, timings, errors = results.get()
+        collected[kind] = (collected[kind][0] + timings, collected[kind][1] + errors)
+    for worker in workers:
+        worker.join()
+    return collected
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=3, help='reader processes')
+    parser.add_argument('--writers', type=int, default=2, help='writer processes')
+    parser.add_argument('--hold-ms', type=float, default=0, help='time writers keep their transaction open')
+    parser.add_argument('--batch', type=int, default=20000, help='contacts inserted per write transaction')
+    parser.add_argument('--rows', type=int, default=20000, help='quote requests and contacts to seed')
+    parser.add_argument('--dir', help='where to create the database (default: system temp dir)')
+    args = parser.parse_args()
+
+    print(f"📊 {args.readers} readers, {args.writers} writers, {args.seconds:g}s, {args.rows:,} rows")
+    for profile in PROFILES:
+        collected = run(profile, args)
+        reads, read_errors = collected['read']
+        writes, write_errors = collected['write']
+        print(f"  {profile:7} reads {len(reads) / args.seconds:7.1f}/s   p50 {statistics.median(reads):7.2f} ms   "
+              f"p99 {percentile(reads, 0.99):8.2f} ms   max {max(reads):8.2f} ms   "
+              f"writes {len(writes) / args.seconds:5.1f}/s"
+              + (f"   ❌ {read_errors + write_errors} locked" if read_errors + write_errors else ''))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Process-wide caches for data that only changes through the admin panel.
+
+Every cached dataset depends on one or more named tags ("settings",
+"services", ...). Each tag has a stamp file under ``instance/cache`` that
+the admin handlers rewrite after committing a change. A worker reads the
+stamps once per request and compares them with the ones it loaded its data
+under. An edit made in one gunicorn worker therefore invalidates the copies
+held by all the others, and the check never touches the database.
+"""
+from flask import current_app, g, has_app_context, has_request_context
+from blinker import Namespace
+from datetime import datetime
+import os
+import threading
+import time
+
+STAMP_DIR = 'cache'
+
+# Every tag the site invalidates; anything else is refused
+TAGS = ('settings', 'services', 'portfolio', 'assets')
+
+_signals = Namespace()
+
+# Sent with ``tags=`` after the stamps are rewritten, so per-process stores
+# (like the page cache) can free their stale entries right away
+tags_invalidated = _signals.signal('tags-invalidated')
+
+
+def _stamp_path(tag):
+    return os.path.join(current_app.instance_path, STAMP_DIR, f'{tag}.stamp')
+
+
+def _read_stamp(tag):
+    try:
+        with open(_stamp_path(tag)) as stamp:
+            return stamp.read().strip() or '0'
+    except FileNotFoundError:
+        return '0'
+
+
+def tag_version(tag):
+    """Return the current version string of a tag"""
+    if not has_request_context():
+        return _read_stamp(tag)
+    versions = g.setdefault('_cache_tag_versions', {})
+    if tag not in versions:
+        versions[tag] = _read_stamp(tag)
+    return versions[tag]
+
+
+def tag_versions(*tags):
+    """Return the current versions of several tags as a tuple"""
+    return tuple(tag_version(tag) for tag in tags)
+
+
+def tag_timestamp(tag):
+    """Return when a tag was last invalidated (naive UTC), or None"""
+    version = tag_version(tag)
+    try:
+        return datetime.utcfromtimestamp(int(version.split('-', 1)[0]) / 1e9)
+    except ValueError:
+        return None
+
+
+def invalidate(*tags):
+    """Mark the data behind the given tags as changed in every worker"""
+    unknown = [tag for tag in tags if tag not in TAGS]
+    if unknown:
+        raise ValueError(f'Unknown cache tags: {", ".join(map(repr, unknown))}')
+    if not has_app_context():
+        return
+    stamp_dir = os.path.join(current_app.instance_path, STAMP_DIR)
+    os.makedirs(stamp_dir, exist_ok=True)
+    # time + pid keeps concurrent bumps from different workers distinct
+    version = f'{time.time_ns()}-{os.getpid()}'
+    for tag in tags:
+        path = _stamp_path(tag)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as stamp:
+            stamp.write(version)
+        os.replace(tmp_path, path)
+        if has_request_context():
+            g.setdefault('_cache_tag_versions', {})[tag] = version
+    tags_invalidated.send(current_app._get_current_object(), tags=tags)
+
+
+class CachedLoader:
+    """Keep the result of ``loader()`` until one of its tags changes"""
+
+    def __init__(self, loader, *tags):
+        self.loader = loader
+        self.tags = tags
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self):
+        key = current_app.instance_path
+        versions = tag_versions(*self.tags)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == versions:
+            return entry[1]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions:
+                return entry[1]
+            # Versions are read before loading, so a concurrent change can
+            # only cause an extra reload, never a stale entry
+            value = self.loader()
+            self._entries[key] = (versions, value)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,153 @@
+"""gzip/brotli compression of text responses.
+
+Every HTML, JSON, CSS or JS response of at least ``COMPRESS_MIN_SIZE``
+bytes is compressed with the best encoding the client accepts (brotli when
+the ``brotli`` package is installed, otherwise gzip). Streamed responses
+are compressed chunk by chunk with a sync flush after each one, so the
+browser can start rendering before the whole page has been generated.
+
+The page cache stores the compressed bodies next to the plain one, so a
+warm cache hit is served without compressing anything.
+"""
+from flask import request
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'text/xml',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'application/x-ndjson',
+    'application/xml',
+    'image/svg+xml',
+}
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class _GzipStream:
+    def __init__(self, level):
+        # wbits=31 writes a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def chunk(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class Compression:
+    """Negotiate and apply Content-Encoding for text responses"""
+
+    def __init__(self, app=None):
+        self.encodings = ()
+        self.levels = {}
+        self.min_size = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ALGORITHMS', 'br,gzip')
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BR_LEVEL', 4)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+
+        algorithms = [name.strip() for name in app.config['COMPRESS_ALGORITHMS'].split(',')]
+        self.encodings = tuple(name for name in algorithms
+                               if name == 'gzip' or (name == 'br' and brotli is not None))
+        self.levels = {'gzip': int(app.config['COMPRESS_LEVEL']),
+                       'br': int(app.config['COMPRESS_BR_LEVEL'])}
+        self.min_size = int(app.config['COMPRESS_MIN_SIZE'])
+
+        app.after_request(self.after_request)
+        app.extensions['compression'] = self
+
+    def negotiate(self):
+        """Best encoding accepted by the current request, or None"""
+        accepted = request.accept_encodings
+        candidates = [(accepted[name], -index, name) for index, name in enumerate(self.encodings)
+                      if accepted[name]]
+        return max(candidates)[2] if candidates else None
+
+    def is_compressible(self, response):
+        return (response.mimetype in COMPRESSIBLE_MIMETYPES
+                and 200 <= response.status_code < 300
+                and response.status_code != 204
+                and 'Content-Encoding' not in response.headers
+                and 'no-transform' not in response.headers.get('Cache-Control', ''))
+
+    def encode_all(self, body):
+        """Every configured encoding of a body worth compressing"""
+        if len(body) < self.min_size:
+            return {}
+        return {encoding: compress(body, encoding, self.levels[encoding])
+                for encoding in self.encodings}
+
+    @staticmethod
+    def apply(response, body, encoding):
+        """Replace a response's body with an already compressed one"""
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        # The bytes differ per encoding, so a strong validator no longer fits
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _stream(self, chunks, encoding):
+        stream = (_BrotliStream if encoding == 'br' else _GzipStream)(self.levels[encoding])
+        for chunk in chunks:
+            data = stream.chunk(chunk)
+            if data:
+                yield data
+        yield stream.finish()
+
+    def after_request(self, response):
+        # File responses are served as they are (see assets.py for CSS/JS)
+        if response.direct_passthrough or not self.is_compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._stream(response.iter_encoded(), encoding)
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Length', None)
+            return response
+
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+        return self.apply(response, compress(body, encoding, self.levels[encoding]), encoding)
+
+
+compression = Compression()
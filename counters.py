@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Incrementally Maintained Row Counters for the Admin Dashboard
+
+Counting quote requests and contacts with COUNT(*) gets slower as the tables
+grow. Instead, stat_counters keeps one row per total and per state value
+("quote_requests", "quote_requests:estado=pendiente", ...). ORM events
+update them inside the same flush that inserts, updates or deletes the
+counted rows. The dashboard therefore reads every number with one small
+query, whatever the table sizes.
+
+Set-based UPDATE/DELETE statements bypass the ORM events; code that issues
+them must call adjust() itself. If the counters are ever missing or in
+doubt, rebuild them from grouped aggregates with:
+    python counters.py
+"""
+
+from sqlalchemy import event, func, inspect
+from models import db, Service, Portfolio, QuoteRequest, Contact, StatCounter
+
+# Model -> (counter prefix, column whose values are counted separately)
+COUNTED_MODELS = {
+    Service: ('services', 'activo'),
+    Portfolio: ('portfolio', 'activo'),
+    QuoteRequest: ('quote_requests', 'estado'),
+    Contact: ('contacts', 'estado'),
+}
+
+# Present once the counters have been built from the tables at least once
+BUILT_MARKER = 'counters:built'
+
+def _label(value):
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+def counter_name(prefix, column=None, value=None):
+    if column is None:
+        return prefix
+    return f'{prefix}:{column}={_label(value)}'
+
+def adjust(connection, deltas):
+    """Apply {counter name: delta} in the caller's transaction"""
+    table = StatCounter.__table__
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        result = connection.execute(
+            table.update().where(table.c.name == name).values(value=table.c.value + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(name=name, value=delta))
+
+def _on_insert(mapper, connection, target):
+    prefix, column = COUNTED_MODELS[mapper.class_]
+    adjust(connection, {
+        counter_name(prefix): 1,
+        counter_name(prefix, column, getattr(target, column)): 1,
+    })
+
+def _on_delete(mapper, connection, target):
+    prefix, column = COUNTED_MODELS[mapper.class_]
+    adjust(connection, {
+        counter_name(prefix): -1,
+        counter_name(prefix, column, getattr(target, column)): -1,
+    })
+
+def _on_update(mapper, connection, target):
+    prefix, column = COUNTED_MODELS[mapper.class_]
+    history = inspect(target).attrs[column].history
+    if not history.has_changes() or not history.deleted:
+        return
+    old, new = _label(history.deleted[0]), _label(getattr(target, column))
+    if old == new:
+        return
+    adjust(connection, {
+        counter_name(prefix, column, old): -1,
+        counter_name(prefix, column, new): 1,
+    })
+
+for _model in COUNTED_MODELS:
+    event.listen(_model, 'after_insert', _on_insert)
+    event.listen(_model, 'after_delete', _on_delete)
+    event.listen(_model, 'after_update', _on_update)
+
+def rebuild_counters():
+    """Recompute every counter with one grouped aggregate per table"""
+    counts = {BUILT_MARKER: 1}
+    for model, (prefix, column) in COUNTED_MODELS.items():
+        group_column = getattr(model, column)
+        total = 0
+        for value, count in db.session.query(group_column, func.count()).group_by(group_column):
+            counts[counter_name(prefix, column, value)] = count
+            total += count
+        counts[counter_name(prefix)] = total
+
+    db.session.query(StatCounter).delete()
+    db.session.add_all(StatCounter(name=name, value=value) for name, value in counts.items())
+    db.session.commit()
+    return counts
+
+def read_counters():
+    """All counters in a single query, rebuilding them the first time"""
+    counters = dict(db.session.query(StatCounter.name, StatCounter.value))
+    if BUILT_MARKER not in counters:
+        counters = rebuild_counters()
+    return counters
+
+def dashboard_stats():
+    """Dashboard numbers computed from the counters"""
+    counters = read_counters()
+
+    def get(*args):
+        return counters.get(counter_name(*args), 0)
+
+    return {
+        'total_services': get('services'),
+        'active_services': get('services', 'activo', True),
+        'total_portfolio': get('portfolio'),
+        'active_portfolio': get('portfolio', 'activo', True),
+        'quote_requests': get('quote_requests'),
+        'pending_quotes': get('quote_requests', 'estado', 'pendiente'),
+        'contacts': get('contacts'),
+        'new_contacts': get('contacts', 'estado', 'nuevo'),
+    }
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        counts = rebuild_counters()
+        for name, value in sorted(counts.items()):
+            print(f"{name:45} {value}")
+        print("✅ Counters rebuilt")
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Static Export of the Public Site
+
+Renders every public page (home, services, each service and portfolio
+item, each category listing, the legal pages) and the
+/api/servicios/<id> JSON through the Flask test client and writes them to
+an output directory, so a plain web server can serve the catalogue without
+running Python:
+
+    /                         -> index.html
+    /servicio/5               -> servicio/5.html
+    /servicios?categoria=3    -> servicios/categoria/3.html
+    /api/servicios/3          -> api/servicios/3.json
+
+Each page is recorded in .export-manifest.json with a fingerprint of the
+data it shows (layout, category, service rows...). Later runs only
+re-render pages whose fingerprint changed and delete pages whose record
+was removed or deactivated. Rendering is spread over several processes.
+
+The form pages (/contacto, /cotizacion) are not exported: their POSTs and
+the flash messages shown after them need the app, so the nginx example
+below leaves them to @app.
+
+Usage:
+    python export_site.py [output_dir] [--full] [--jobs N]
+
+Example nginx configuration:
+    root /srv/araiza/export;
+    location /static/ { alias /srv/araiza/app/static/; }
+    location = /servicios {
+        if ($arg_categoria) { rewrite ^ /servicios/categoria/$arg_categoria.html last; }
+        try_files /servicios.html =404;
+    }
+    location /api/ { default_type application/json; try_files $uri.json @app; }
+    location / { try_files $uri.html $uri/index.html @app; }
+    location @app { proxy_pass http://127.0.0.1:5000; }
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import func
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+MANIFEST = '.export-manifest.json'
+DEFAULT_OUTPUT = 'export'
+CHUNK_SIZE = 200
+
+# Matches the limit in app.servicio_detalle
+RELATED_SERVICES = 3
+
+# Pages that only depend on the layout and the site settings
+LAYOUT_PAGES = ('/acerca', '/terminos', '/privacidad', '/accesibilidad')
+
+def fingerprint(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+def output_path(url):
+    """File (relative to the output dir) that holds a URL"""
+    if url == '/':
+        return 'index.html'
+    path, _, query = url.partition('?')
+    if query.startswith('categoria='):
+        return f"{path.strip('/')}/categoria/{query.split('=', 1)[1]}.html"
+    if path.startswith('/api/'):
+        return path.strip('/') + '.json'
+    return path.strip('/') + '.html'
+
+def plan_pages():
+    """Every exportable URL with the fingerprint of the data it renders"""
+    from flask import current_app
+    from app import categories_menu, site_settings
+    from cache import tag_version
+    from models import db, Category, Service, Portfolio
+    from page_cache import deploy_version
+
+    # A deploy (new templates or code) re-renders everything
+    layout = fingerprint(sorted(site_settings.get().items()), categories_menu.get(),
+                         tag_version('assets'), deploy_version(current_app)[0])
+    categories = db.session.query(Category.id, Category.updated_at).order_by(Category.id).all()
+    all_categories = fingerprint(categories)
+
+    # Every service change bumps updated_at (including activo), and a delete
+    # changes the count, so these describe each category's listing
+    service_stats = dict.fromkeys((category_id for category_id, _ in categories), (0, None))
+    for category_id, count, latest in db.session.query(
+            Service.id_categoria, func.count(), func.max(Service.updated_at)).group_by(Service.id_categoria):
+        service_stats[category_id] = (count, latest)
+    category_updated = dict(categories)
+    all_services = fingerprint(sorted(service_stats.items()))
+
+    portfolio_stats = db.session.query(func.count(), func.max(Portfolio.updated_at)).one()
+    all_portfolio = fingerprint(tuple(portfolio_stats))
+
+    pages = {
+        '/': fingerprint(layout, all_categories, all_services, all_portfolio),
+        '/servicios': fingerprint(layout, all_categories, all_services),
+        '/portafolio': fingerprint(layout, all_portfolio),
+    }
+    for url in LAYOUT_PAGES:
+        pages[url] = layout
+
+    for category_id, updated_at in categories:
+        stats = service_stats[category_id]
+        pages[f'/servicios?categoria={category_id}'] = fingerprint(layout, all_categories, updated_at, stats)
+        pages[f'/api/servicios/{category_id}'] = fingerprint(stats)
+
+    # A detail page lists the first three other active services of its
+    # category, which are always among the category's first four
+    services = db.session.query(Service.id, Service.id_categoria, Service.updated_at).filter(
+        Service.activo == True).order_by(Service.id).all()
+    leading = {}
+    for service_id, category_id, updated_at in services:
+        first = leading.setdefault(category_id, [])
+        if len(first) <= RELATED_SERVICES:
+            first.append((service_id, updated_at))
+    for service_id, category_id, updated_at in services:
+        pages[f'/servicio/{service_id}'] = fingerprint(
+            layout, category_updated.get(category_id), updated_at, leading[category_id])
+
+    for portfolio_id, updated_at in db.session.query(Portfolio.id, Portfolio.updated_at).filter(Portfolio.activo == True):
+        pages[f'/portafolio/{portfolio_id}'] = fingerprint(layout, updated_at)
+
+    return pages
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as output:
+        output.write(data)
+    # Atomic, so the web server never serves a half-written page
+    os.replace(tmp_path, path)
+
+_client = None
+
+def _init_worker():
+    global _client
+    from app import app
+    _client = app.test_client()
+
+def render_pages(urls, output_dir):
+    """Render and write a batch of URLs; return [(url, error or None)]"""
+    if _client is None:
+        _init_worker()
+    results = []
+    for url in urls:
+        response = _client.get(url)
+        if response.status_code != 200:
+            results.append((url, f'HTTP {response.status_code}'))
+            continue
+        _write(os.path.join(output_dir, *output_path(url).split('/')), response.get_data())
+        results.append((url, None))
+    return results
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as manifest:
+            return json.load(manifest)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def export(output_dir, full=False, jobs=None):
+    """Export changed pages; return (rendered, failed, removed)"""
+    previous = {} if full else load_manifest(output_dir)
+    pages = plan_pages()
+    pending = [url for url, value in pages.items() if previous.get(url) != value]
+    stale = [url for url in previous if url not in pages]
+
+    jobs = jobs or os.cpu_count() or 1
+    batches = [pending[i:i + CHUNK_SIZE] for i in range(0, len(pending), CHUNK_SIZE)]
+    if jobs > 1 and len(batches) > 1:
+        # Fresh interpreters: forked workers would share the parent's DB connections
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(jobs, mp_context=context, initializer=_init_worker) as pool:
+            results = [result for batch in pool.map(render_pages, batches, [output_dir] * len(batches))
+                       for result in batch]
+    else:
+        results = [result for batch in batches for result in render_pages(batch, output_dir)]
+
+    failed = {url: error for url, error in results if error}
+    for url in stale:
+        try:
+            os.remove(os.path.join(output_dir, *output_path(url).split('/')))
+        except FileNotFoundError:
+            pass
+
+    # Failed pages stay out of the manifest so the next run retries them
+    manifest = {url: value for url, value in pages.items() if url not in failed}
+    _write(os.path.join(output_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return len(results) - len(failed), failed, stale
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output', nargs='?', default=DEFAULT_OUTPUT)
+    parser.add_argument('--full', action='store_true', help='re-render every page')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    # Exported pages are written to disk, not kept in the page cache, and
+    # the exporter must not start an outbox worker
+    os.environ['PAGE_CACHE_BACKEND'] = 'none'
+    os.environ['OUTBOX_WORKER'] = 'none'
+    from app import app
+
+    output_dir = os.path.abspath(args.output)
+    started = time.perf_counter()
+    with app.app_context():
+        rendered, failed, removed = export(output_dir, full=args.full, jobs=args.jobs)
+
+    for url, error in sorted(failed.items()):
+        print(f"❌ {url}: {error}")
+    print(f"🗑️  Removed {len(removed)} pages")
+    print(f"✅ Exported {rendered} pages to {output_dir} in {time.perf_counter() - started:.1f}s")
+    if failed:
+        sys.exit(1)
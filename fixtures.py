@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Catalogue Fixtures: Bulk Import and Export
+
+Loads and dumps the catalogue tables as fixtures:
+
+    .json   {"categories": [{...}, ...], "services": [...], ...}
+    .jsonl  one row per line, with its table in "_table"
+    .csv    one table per file, named after it (services.csv) or given
+            with --table
+
+Rows are written with batched INSERT ... ON CONFLICT DO UPDATE statements,
+all files in one transaction, so loading the same fixture twice updates
+the rows instead of duplicating them (the key is "id", or "key" for
+site_settings) and a broken file leaves the database untouched. Columns
+missing from a row keep their current value, or get the model default;
+required (NOT NULL) columns must always be given.
+
+The default content of a new database lives in fixtures/default.json.
+
+Usage:
+    python fixtures.py load <file> [<file> ...] [--table NAME]
+    python fixtures.py dump <file> [--table NAME ...]
+"""
+
+from models import db, Category, Service, Portfolio, SiteSettings, QuoteRequest, Contact
+from sqlalchemy.dialects import postgresql, sqlite
+import search
+from datetime import date, datetime
+import csv
+import json
+import os
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'default.json')
+
+# Load order (parents first) and the column each table is upserted on
+TABLES = {
+    'categories': (Category, 'id'),
+    'services': (Service, 'id'),
+    'portfolio': (Portfolio, 'id'),
+    'site_settings': (SiteSettings, 'key'),
+    'quote_requests': (QuoteRequest, 'id'),
+    'contacts': (Contact, 'id'),
+}
+
+# Rows per executemany batch
+BATCH_SIZE = 2000
+
+# Fixtures this large skip the search triggers and index the rows they
+# wrote once, at the end
+BULK_LOAD_BYTES = 1024 * 1024
+
+TRUE_STRINGS = {'1', 'true', 't', 'yes', 'si', 'sí'}
+
+def _format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension not in ('json', 'jsonl', 'csv'):
+        raise ValueError(f'Unsupported fixture format: {path}')
+    return extension
+
+def _table(name):
+    if name not in TABLES:
+        raise ValueError(f'Unknown table "{name}"; expected one of: {", ".join(TABLES)}')
+    return TABLES[name][0].__table__
+
+def _parse_bool(value):
+    return str(value).strip().lower() in TRUE_STRINGS
+
+def _converter(column):
+    """Function converting a JSON/CSV value to the column's Python type"""
+    python_type = column.type.python_type
+    parse = {bool: _parse_bool, datetime: datetime.fromisoformat, date: date.fromisoformat}.get(python_type, python_type)
+
+    def convert(value):
+        if value is None or (value == '' and python_type is not str):
+            return None
+        if type(value) is python_type:
+            return value
+        return parse(value)
+    return convert
+
+def converters(name):
+    """Column name -> converter for the rows of a table"""
+    table = _table(name)
+    return {column.key: _converter(column) for column in table.columns}
+
+def read_rows(path, table=None):
+    """Yield (table name, row dict) pairs from a fixture file"""
+    fmt = _format(path)
+    with open(path, newline='' if fmt == 'csv' else None, encoding='utf-8') as fixture:
+        if fmt == 'json':
+            for name, rows in json.load(fixture).items():
+                for row in rows:
+                    yield name, row
+        elif fmt == 'jsonl':
+            for line in fixture:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row.pop('_table', table), row
+        else:
+            name = table or os.path.splitext(os.path.basename(path))[0]
+            for row in csv.DictReader(fixture):
+                yield name, row
+
+def _upsert(connection, table, key, rows):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        insert = sqlite.insert
+    elif dialect == 'postgresql':
+        insert = postgresql.insert
+    else:
+        raise RuntimeError(f'Upserts are not supported on {dialect}')
+
+    # One cached statement run with executemany, not a compiled multi-row VALUES
+    statement = insert(table)
+    updates = {name: statement.excluded[name] for name in rows[0] if name != key}
+    if 'updated_at' in table.c and 'updated_at' not in rows[0]:
+        # onupdate defaults don't apply to the DO UPDATE half
+        updates['updated_at'] = statement.excluded['updated_at']
+    if updates:
+        statement = statement.on_conflict_do_update(index_elements=[key], set_=updates)
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=[key])
+    connection.execute(statement, rows)
+
+def load(connection, rows, touched=None):
+    """Upsert (table name, row) pairs in batches; return rows loaded per table
+
+    The keys written are added to touched[name] for the tables it has.
+    """
+    pending = {name: {} for name in TABLES}
+    counts = dict.fromkeys(TABLES, 0)
+
+    def flush(name, columns):
+        batch = pending[name].pop(columns)
+        key = TABLES[name][1]
+        _upsert(connection, _table(name), key, batch)
+        counts[name] += len(batch)
+        if touched is not None and name in touched:
+            touched[name].update(row[key] for row in batch)
+
+    converters_by_table = {}
+    for name, row in rows:
+        if name not in converters_by_table:
+            converters_by_table[name] = converters(name)
+        convert = converters_by_table[name]
+        try:
+            row = {column: convert[column](value) for column, value in row.items()}
+        except KeyError:
+            unknown = set(row) - set(convert)
+            raise ValueError(f'Unknown columns for {name}: {", ".join(sorted(unknown))}')
+        if TABLES[name][1] not in row:
+            raise ValueError(f'{name} rows need a "{TABLES[name][1]}" value')
+        # Rows of one executemany batch must have the same columns
+        columns = tuple(sorted(row))
+        batch = pending[name].setdefault(columns, [])
+        batch.append(row)
+        # Parents first: a services batch may reference categories still pending
+        if len(batch) >= BATCH_SIZE:
+            for parent in TABLES:
+                if parent == name:
+                    break
+                for parent_columns in list(pending[parent]):
+                    flush(parent, parent_columns)
+            flush(name, columns)
+
+    for name in TABLES:
+        for columns in list(pending[name]):
+            flush(name, columns)
+    return {name: count for name, count in counts.items() if count}
+
+def load_files(paths, table=None):
+    """Load fixture files in a single transaction and refresh what depends on them"""
+    from cache import invalidate
+    from counters import rebuild_counters
+
+    def rows():
+        for path in paths:
+            yield from read_rows(path, table)
+
+    bulk = sum(os.path.getsize(path) for path in paths) >= BULK_LOAD_BYTES
+    with db.engine.begin() as connection:
+        if bulk:
+            with search.bulk_load(connection) as touched:
+                counts = load(connection, rows(), touched)
+        else:
+            counts = load(connection, rows())
+    # Bulk inserts bypass the ORM events that keep the counters current
+    rebuild_counters()
+    invalidate('settings', 'services', 'portfolio')
+    return counts
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def _dump_rows(connection, name):
+    table = _table(name)
+    result = connection.execution_options(yield_per=BATCH_SIZE).execute(
+        table.select().order_by(*table.primary_key.columns))
+    for row in result.mappings():
+        yield {column: _serialize(value) for column, value in row.items()}
+
+def dump(path, tables=None):
+    """Write tables (default: all) to a fixture file; return rows per table"""
+    fmt = _format(path)
+    tables = tables or list(TABLES)
+    for name in tables:
+        _table(name)
+    if fmt == 'csv' and len(tables) != 1:
+        raise ValueError('A CSV fixture holds one table; pass --table')
+
+    counts = dict.fromkeys(tables, 0)
+    with db.engine.connect() as connection, open(path, 'w', newline='', encoding='utf-8') as fixture:
+        if fmt == 'csv':
+            name = tables[0]
+            writer = csv.DictWriter(fixture, fieldnames=_table(name).c.keys())
+            writer.writeheader()
+            for row in _dump_rows(connection, name):
+                writer.writerow(row)
+                counts[name] += 1
+        elif fmt == 'jsonl':
+            for name in tables:
+                for row in _dump_rows(connection, name):
+                    fixture.write(json.dumps({'_table': name, **row}, ensure_ascii=False) + '\n')
+                    counts[name] += 1
+        else:
+            # Written row by row so large tables never sit in memory
+            fixture.write('{')
+            for index, name in enumerate(tables):
+                fixture.write(f'{"," if index else ""}\n    {json.dumps(name)}: [')
+                for row in _dump_rows(connection, name):
+                    fixture.write(f'{"," if counts[name] else ""}\n        {json.dumps(row, ensure_ascii=False)}')
+                    counts[name] += 1
+                fixture.write('\n    ]')
+            fixture.write('\n}\n')
+    return counts
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    from app import app
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['load', 'dump'])
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--table', action='append', help='table of CSV files (dump: tables to write)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with app.app_context():
+        if args.command == 'load':
+            print(f"📥 Loading {', '.join(args.files)}...")
+            counts = load_files(args.files, args.table[0] if args.table else None)
+        else:
+            counts = dump(args.files[0], args.table)
+    summary = ', '.join(f'{count} {name}' for name, count in counts.items()) or 'nothing'
+    action = 'Loaded' if args.command == 'load' else 'Dumped'
+    print(f"✅ {action} {summary} in {time.perf_counter() - started:.1f}s")
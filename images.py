@@ -0,0 +1,134 @@
+"""Responsive image variants for admin uploads.
+
+After an admin uploads a service or portfolio image, a background thread
+generates a fixed set of resized copies (thumb, card, full) in WebP, and in
+AVIF when the installed Pillow supports it. EXIF and other metadata are
+stripped. The variant URLs and dimensions are stored as JSON on the
+record's ``imagen_variantes`` column, and the templates turn them into
+``srcset`` candidates.
+
+Pillow is optional: without it uploads are served as they are.
+"""
+from flask import current_app
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+
+from cache import invalidate
+from models import db
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> maximum width in pixels
+VARIANTS = {
+    'thumb': 320,
+    'card': 640,
+    'full': 1280,
+}
+
+QUALITY = {
+    'webp': 80,
+    'avif': 55,
+}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='images')
+
+
+def available_formats():
+    """Output formats supported by the installed Pillow"""
+    if Image is None:
+        return []
+    Image.init()
+    return [fmt for fmt in ('avif', 'webp') if fmt.upper() in Image.SAVE]
+
+
+def url_to_path(url):
+    """Filesystem path of a /static/... URL"""
+    static_url = current_app.static_url_path.rstrip('/') + '/'
+    if not url or not url.startswith(static_url):
+        return None
+    return os.path.join(current_app.static_folder, *url[len(static_url):].split('/'))
+
+
+def path_to_url(path):
+    relative = os.path.relpath(path, current_app.static_folder).replace(os.sep, '/')
+    return f'{current_app.static_url_path}/{relative}'
+
+
+def generate_variants(source_path):
+    """Write every variant next to the original and describe them"""
+    formats = available_formats()
+    if not formats:
+        return []
+
+    base, _ = os.path.splitext(source_path)
+    variants = []
+    with Image.open(source_path) as original:
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        done_widths = set()
+        for name, max_width in sorted(VARIANTS.items(), key=lambda item: item[1]):
+            # Don't upscale: small originals get fewer, smaller variants
+            width = min(max_width, image.width)
+            if width in done_widths:
+                continue
+            done_widths.add(width)
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image.copy()
+            for fmt in formats:
+                path = f'{base}-{name}.{fmt}'
+                # Content-addressed originals make existing variants reusable
+                if not os.path.exists(path):
+                    # Saving without exif/icc arguments drops the metadata
+                    resized.save(path, fmt.upper(), quality=QUALITY[fmt])
+                variants.append({
+                    'name': name,
+                    'format': fmt,
+                    'width': width,
+                    'height': height,
+                    'url': path_to_url(path),
+                })
+    return variants
+
+
+def _process(app, model, record_id, image_url, tag):
+    with app.app_context():
+        try:
+            source_path = url_to_path(image_url)
+            if source_path is None or not os.path.exists(source_path):
+                return
+            variants = generate_variants(source_path)
+            record = db.session.get(model, record_id)
+            # Skip if the image was replaced while we were working
+            if record is None or record.imagen != image_url:
+                return
+            record.imagen_variantes = json.dumps(variants) if variants else None
+            db.session.commit()
+            invalidate(tag)
+        except Exception:
+            logger.exception('Could not process image %s', image_url)
+            db.session.rollback()
+
+
+def process_image_async(record, tag):
+    """Queue variant generation for a committed Service/Portfolio record"""
+    if Image is None or not record.imagen:
+        return None
+    app = current_app._get_current_object()
+    return _executor.submit(_process, app, type(record), record.id, record.imagen, tag)
+
+
+def srcset(variants, fmt):
+    """``srcset`` attribute value for one format"""
+    return ', '.join(f"{variant['url']} {variant['width']}w"
+                     for variant in variants if variant['format'] == fmt)
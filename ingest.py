@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Write-Behind Ingestion of Public Form Submissions
+
+By default (INGEST_MODE=direct) /contacto and /cotizacion save every
+submission in its own transaction: one SQLite commit, with its fsyncs, per
+form, and writers queueing on the database lock during bursts. With
+INGEST_MODE=journal the form is still validated during the request, but the
+row is appended to a journal file and the visitor is answered right away. A
+background thread then group-commits the journaled submissions, together
+with their outbox messages and counter updates, every INGEST_FLUSH_MS
+milliseconds or as soon as INGEST_BATCH_SIZE of them are waiting.
+
+Each process writes its own journal files in instance/ingest (INGEST_DIR)
+and keeps them locked. The name of a journal is recorded in ingest_segments
+in the same transaction as its rows, and the file is deleted afterwards. On
+startup, journals left behind by a process that died are replayed, skipping
+those already committed, so a submission is never lost or saved twice. Every
+line is written to the OS before the request returns, which survives a
+crashed process; INGEST_FSYNC=1 also fsyncs it, which survives a power loss.
+
+Rows the database refuses are set aside one by one (with savepoints) in
+rejected.jsonl, so they can't hold up the rest of their batch.
+
+Automatic replay needs file locks (fcntl), which Windows lacks; there, stop
+the site and replay by hand:
+    python ingest.py replay
+"""
+
+from models import db, IngestSegment, OutboxMessage
+from counters import COUNTED_MODELS, adjust, counter_name
+from fixtures import converters
+import background
+from sqlalchemy import delete, exc, insert, select
+from datetime import date, datetime
+import atexit
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = '.journal'
+REJECTED_FILE = 'rejected.jsonl'
+
+# Table name -> (counter prefix, counted column), see counters.py
+COUNTED_TABLES = {model.__tablename__: counted for model, counted in COUNTED_MODELS.items()}
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _lock(journal_file):
+    """Lock a journal for this process; False if another process holds it"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(journal_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def prepare_row(table, values):
+    """Convert form values to the column types and fill the static defaults
+
+    Raises ValueError for unknown columns or values of the wrong type, so
+    bad input is refused during the request, not when the batch is saved.
+    """
+    convert = converters(table.name)
+    try:
+        row = {column: convert[column](value) for column, value in values.items()}
+    except KeyError:
+        unknown = set(values) - set(convert)
+        raise ValueError(f'Unknown columns for {table.name}: {", ".join(sorted(unknown))}')
+    for column in table.columns:
+        if column.key in row or column.primary_key:
+            continue
+        if column.default is not None and column.default.is_scalar:
+            row[column.key] = column.default.arg
+        else:
+            row[column.key] = None
+    return row
+
+
+def insert_records(connection, records):
+    """Insert journaled records; return the counter deltas they cause"""
+    rows = {}
+    messages = []
+    for record in records:
+        rows.setdefault(record['table'], []).append(record['row'])
+        messages.extend({'tipo': tipo, 'payload': json.dumps(payload)} for tipo, payload in record['outbox'])
+
+    deltas = {}
+    for name, batch in rows.items():
+        connection.execute(insert(db.metadata.tables[name]), batch)
+        if name not in COUNTED_TABLES:
+            continue
+        prefix, column = COUNTED_TABLES[name]
+        deltas[counter_name(prefix)] = deltas.get(counter_name(prefix), 0) + len(batch)
+        for row in batch:
+            key = counter_name(prefix, column, row[column])
+            deltas[key] = deltas.get(key, 0) + 1
+    if messages:
+        connection.execute(insert(OutboxMessage.__table__), messages)
+    return deltas
+
+
+class _Journal:
+    """An append-only file of submissions, locked while this process writes it"""
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.fsync = fsync
+        self.records = []
+        self._file = open(path, 'a', encoding='utf-8')
+        _lock(self._file)
+
+    def append(self, line, record):
+        self._file.write(line + '\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.records.append(record)
+
+    def remove(self):
+        # Deleted before closing, so no replay can lock it in between
+        os.remove(self.path)
+        self._file.close()
+
+
+class Ingestor:
+    """Journal form submissions and group-commit them in the background"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.directory = None
+        self.flush_interval = 0.2
+        self.batch_size = 500
+        self.fsync = False
+        self.saved = 0
+        self.rejected = 0
+        self._journal = None
+        self._pending = []
+        self._committed = []
+        self._replayed = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sequence = itertools.count()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('INGEST_MODE', 'direct')
+        app.config.setdefault('INGEST_DIR', os.path.join(app.instance_path, 'ingest'))
+        app.config.setdefault('INGEST_FLUSH_MS', 200)
+        app.config.setdefault('INGEST_BATCH_SIZE', 500)
+        app.config.setdefault('INGEST_FSYNC', False)
+
+        mode = app.config['INGEST_MODE']
+        if mode not in ('direct', 'journal'):
+            raise ValueError(f'Unknown INGEST_MODE: {mode}')
+        self.app = app
+        self.enabled = mode == 'journal'
+        self.directory = app.config['INGEST_DIR']
+        self.flush_interval = int(app.config['INGEST_FLUSH_MS']) / 1000
+        self.batch_size = int(app.config['INGEST_BATCH_SIZE'])
+        self.fsync = bool(app.config['INGEST_FSYNC'])
+        app.extensions['ingest'] = self
+
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            # Every web process flushes its own journals, including workers
+            # forked after the import (gunicorn --preload)
+            background.on_first_request(app, self._start_flusher)
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._after_fork)
+            atexit.register(self.close)
+
+    def _start_flusher(self):
+        threading.Thread(target=self._run, name='ingest-flusher', daemon=True).start()
+
+    def _after_fork(self):
+        # The parent's journals, and its locks on them, stay the parent's
+        self._journal = None
+        self._pending = []
+        self._committed = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def submit(self, model, values, outbox=()):
+        """Journal a validated row, plus (tipo, payload) outbox messages
+
+        The row is saved by the next group commit; raises ValueError if the
+        values don't fit the table.
+        """
+        values = dict(values)
+        values.setdefault('created_at', datetime.utcnow())
+        record = {'table': model.__tablename__, 'row': prepare_row(model.__table__, values),
+                  'outbox': [list(message) for message in outbox]}
+        line = json.dumps(record, ensure_ascii=False, default=_serialize)
+
+        with self._lock:
+            if self._journal is None:
+                name = f'{os.getpid()}-{time.time_ns()}-{next(self._sequence)}{JOURNAL_SUFFIX}'
+                self._journal = _Journal(os.path.join(self.directory, name), self.fsync)
+            self._journal.append(line, record)
+            full = len(self._journal.records) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    # Without file locks a live process's journal can't be told apart
+                    if not self._replayed and fcntl is not None:
+                        self.replay()
+                    self._replayed = True
+                    self.flush()
+            except Exception:
+                # The journals stay on disk; the next round retries them
+                logger.exception('Ingest flush failed')
+
+    def flush(self):
+        """Commit everything journaled so far; return the rows saved"""
+        with self._flush_lock:
+            with self._lock:
+                if self._journal is not None:
+                    self._pending.append(self._journal)
+                    self._journal = None
+            saved = 0
+            while self._pending:
+                journal = self._pending[0]
+                saved += self._commit(journal.name, journal.records)
+                self._pending.pop(0)
+                journal.remove()
+                self._committed.append(journal.name)
+            return saved
+
+    def _commit(self, name, records):
+        """Save one journal's records and mark it committed, in one transaction"""
+        rejected = []
+        with db.engine.begin() as connection:
+            # Markers of journals deleted since the last commit aren't needed
+            if self._committed:
+                connection.execute(delete(IngestSegment.__table__).where(
+                    IngestSegment.name.in_(self._committed)))
+            try:
+                with connection.begin_nested():
+                    deltas = insert_records(connection, records)
+            except (exc.IntegrityError, exc.DataError):
+                deltas = {}
+                for record in records:
+                    try:
+                        with connection.begin_nested():
+                            for key, delta in insert_records(connection, [record]).items():
+                                deltas[key] = deltas.get(key, 0) + delta
+                    except (exc.IntegrityError, exc.DataError) as e:
+                        rejected.append(dict(record, error=str(e.orig)))
+            adjust(connection, deltas)
+            connection.execute(insert(IngestSegment.__table__).values(name=name, created_at=datetime.utcnow()))
+        self._committed.clear()
+
+        if rejected:
+            logger.warning('%d submissions of %s rejected by the database; see %s',
+                           len(rejected), name, REJECTED_FILE)
+            with open(os.path.join(self.directory, REJECTED_FILE), 'a', encoding='utf-8') as f:
+                for record in rejected:
+                    f.write(json.dumps(record, ensure_ascii=False, default=_serialize) + '\n')
+        saved = len(records) - len(rejected)
+        self.saved += saved
+        self.rejected += len(rejected)
+        return saved
+
+    @staticmethod
+    def _is_committed(name):
+        query = select(IngestSegment.name).where(IngestSegment.name == name)
+        with db.engine.connect() as connection:
+            return connection.execute(query).first() is not None
+
+    def replay(self):
+        """Commit the journals of processes that stopped; return the rows saved"""
+        with db.engine.connect() as connection:
+            committed = set(connection.execute(select(IngestSegment.name)).scalars())
+        own = {journal.name for journal in self._pending}
+        if self._journal is not None:
+            own.add(self._journal.name)
+
+        saved = 0
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(JOURNAL_SUFFIX))
+        for name in names:
+            if name in own:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                journal_file = open(path, 'r+', encoding='utf-8')
+            except FileNotFoundError:
+                continue  # committed and removed since the listing
+            try:
+                if not _lock(journal_file):
+                    continue  # its process is still running
+                # Another replay may have committed and removed it while we
+                # waited for the lock
+                if os.fstat(journal_file.fileno()).st_nlink == 0:
+                    continue
+                if not self._is_committed(name):
+                    records = []
+                    for line in journal_file:
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            # A line cut short by the crash was never acknowledged
+                            logger.warning('Skipping a torn line in %s', name)
+                    for record in records:
+                        record['row'] = prepare_row(db.metadata.tables[record['table']], record['row'])
+                    saved += self._commit(name, records)
+                    logger.info('Replayed %d submissions from %s', len(records), name)
+                os.remove(path)
+                self._committed.append(name)
+            finally:
+                journal_file.close()
+
+        # Markers whose journal is gone, e.g. after a crash right after deleting it
+        stale = committed - set(os.listdir(self.directory))
+        if stale:
+            with db.engine.begin() as connection:
+                connection.execute(delete(IngestSegment.__table__).where(IngestSegment.name.in_(stale)))
+        return saved
+
+    def close(self):
+        """Commit what is still journaled, e.g. when the process exits"""
+        if self.app is None:
+            return
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception:
+            logger.exception('Ingest flush at exit failed; the journal is replayed on restart')
+
+    def stats(self):
+        with self._lock:
+            waiting = len(self._journal.records) if self._journal is not None else 0
+        waiting += sum(len(journal.records) for journal in self._pending)
+        return {'enabled': self.enabled, 'waiting': waiting, 'saved': self.saved, 'rejected': self.rejected}
+
+
+ingest = Ingestor()
+
+
+if __name__ == '__main__':
+    import sys
+
+    if sys.argv[1:] != ['replay']:
+        print(__doc__)
+        sys.exit(1)
+    # Replay only; don't start a flusher of our own
+    os.environ['INGEST_MODE'] = 'direct'
+    os.environ['OUTBOX_WORKER'] = 'none'
+    from app import app
+
+    logging.basicConfig(level=logging.INFO)
+    if not os.path.isdir(ingest.directory):
+        print("ℹ️  No journals to replay")
+        sys.exit(0)
+    with app.app_context():
+        print(f"📥 Replayed {ingest.replay()} submissions from {ingest.directory}")
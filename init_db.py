@@ -5,42 +5,31 @@ Manual Database Initialization Script for Araiza Inc Website
 This script is for manual database initialization only.
 Normally, the database is automatically initialized when running app.py
 
+Creates the tables and loads the default content (fixtures/default.json)
+into an empty database, then loads any fixture files given (see
+fixtures.py for the formats).
+
 Usage:
-    python init_db.py
+    python init_db.py [fixture ...]
 """
 
-from flask import Flask
-from models import db
-import os
-from dotenv import load_dotenv
+import sys
+from app import app, init_database_if_needed
+import fixtures
 
-def manual_init():
+def manual_init(paths=()):
     """Manual database initialization"""
     print("📊 Manual Database Initialization")
     print("Note: Database is normally auto-initialized by app.py")
     print("="*50)
     
-    # Load environment variables
-    load_dotenv()
-    
-    # Create Flask app
-    app = Flask(__name__)
-    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///araiza_inc.db')
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    
-    # Initialize database
-    db.init_app(app)
-    
     with app.app_context():
-        # Import the initialization function from app.py
-        import sys
-        sys.path.append('.')
-        from app import init_database_if_needed
-        
         init_database_if_needed()
+        if paths:
+            counts = fixtures.load_files(paths)
+            print(f"📥 Loaded {', '.join(f'{count} {name}' for name, count in counts.items())}")
         print("✅ Manual initialization completed!")
         print("🚀 You can now run: python app.py")
 
 if __name__ == '__main__':
-    manual_init()
\ No newline at end of file
+    manual_init(sys.argv[1:])
@@ -0,0 +1,244 @@
+"""Per-endpoint request metrics in the Prometheus text format.
+
+For every request the wall time, the number and total duration of the SQL
+statements it ran (from SQLAlchemy engine events), the time spent rendering
+templates and the size of the response body are added to per-endpoint
+totals, served at ``/metrics``. Each process keeps its own totals, so with
+several gunicorn workers Prometheus sees whichever one answers the scrape;
+add the worker to the target labels or run one scrape per worker.
+
+``SERVER_TIMING=1`` also sends the request's numbers in a ``Server-Timing``
+header, which browsers show in the network panel. With ``METRICS_DEBUG=1``
+a request that runs the same statement more than
+``METRICS_N_PLUS_ONE_THRESHOLD`` times logs a warning naming it, which is
+how N+1 query loops usually show up.
+"""
+from flask import current_app, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from collections import Counter, defaultdict
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Label for requests that matched no route, so 404 scans can't add labels
+UNMATCHED = '<unmatched>'
+
+
+class _RequestStats:
+    """What one request has done so far"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.statements = Counter()
+        self.render_seconds = 0.0
+        self.render_started = []
+
+
+class _EndpointTotals:
+    def __init__(self):
+        self.requests = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.seconds = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.render_seconds = 0.0
+        self.response_bytes = 0
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Collect per-endpoint timings and serve them at /metrics"""
+
+    def __init__(self, app=None):
+        self._totals = defaultdict(_EndpointTotals)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the hooks; call before other after_request users
+        (like compression) so the recorded time and size include them"""
+        app.config.setdefault('SERVER_TIMING', False)
+        app.config.setdefault('METRICS_DEBUG', False)
+        app.config.setdefault('METRICS_N_PLUS_ONE_THRESHOLD', 10)
+
+        app.before_request(self._before_request)
+        # after_request hooks run in reverse order, so this one runs last
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app, weak=False)
+        template_rendered.connect(self._after_render, app, weak=False)
+
+        with app.app_context():
+            from models import db
+            self.watch(db.engine)
+
+        app.add_url_rule('/metrics', 'metrics', self.view)
+        app.extensions['metrics'] = self
+
+    def watch(self, engine):
+        """Count the statements of another engine too (e.g. the read replica)"""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @staticmethod
+    def _current():
+        if not has_request_context():
+            return None
+        return g.get('_metrics')
+
+    def _before_request(self):
+        g._metrics = _RequestStats()
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # On the execution context, so a statement that raises leaves nothing behind
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        stats = self._current()
+        if stats is not None and started is not None:
+            stats.queries += 1
+            stats.query_seconds += time.perf_counter() - started
+            stats.statements[statement] += 1
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = self._current()
+        if stats is not None:
+            stats.render_started.append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        stats = self._current()
+        if stats is not None and stats.render_started:
+            stats.render_seconds += time.perf_counter() - stats.render_started.pop()
+
+    def _after_request(self, response):
+        stats = g.get('_metrics')
+        if stats is None:
+            return response
+        endpoint = request.endpoint or UNMATCHED
+        threshold = None
+        if current_app.config['METRICS_DEBUG']:
+            threshold = current_app.config['METRICS_N_PLUS_ONE_THRESHOLD']
+
+        if response.is_streamed:
+            # The body, and most of the work, happens while it is sent; the
+            # request context (and g) stay alive until then
+            response.response = self._count_stream(response.response, stats, endpoint, threshold)
+            return response
+
+        size = response.calculate_content_length() or 0
+        if current_app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = self.server_timing(stats)
+        self._record(stats, endpoint, size, threshold)
+        return response
+
+    def _count_stream(self, chunks, stats, endpoint, threshold):
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            # Runs after the request context is gone
+            self._record(stats, endpoint, size, threshold)
+
+    @staticmethod
+    def server_timing(stats):
+        elapsed = time.perf_counter() - stats.started
+        return (f'app;dur={elapsed * 1000:.1f}, '
+                f'db;dur={stats.query_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                f'render;dur={stats.render_seconds * 1000:.1f}')
+
+    def _record(self, stats, endpoint, size, threshold):
+        elapsed = time.perf_counter() - stats.started
+        with self._lock:
+            totals = self._totals[endpoint]
+            totals.requests += 1
+            totals.seconds += elapsed
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if elapsed <= bound:
+                    totals.buckets[index] += 1
+            totals.queries += stats.queries
+            totals.query_seconds += stats.query_seconds
+            totals.render_seconds += stats.render_seconds
+            totals.response_bytes += size
+
+        if threshold is not None:
+            for statement, count in stats.statements.most_common():
+                if count <= threshold:
+                    break
+                logger.warning('Possible N+1 in %s: statement ran %d times: %s',
+                               endpoint, count, ' '.join(statement.split())[:300])
+
+    def render(self):
+        """All totals in the Prometheus text exposition format"""
+        with self._lock:
+            totals = {endpoint: vars(values).copy() for endpoint, values in self._totals.items()}
+
+        lines = [
+            '# HELP araiza_request_duration_seconds Wall time of requests per endpoint.',
+            '# TYPE araiza_request_duration_seconds histogram',
+        ]
+        for endpoint, values in sorted(totals.items()):
+            label = f'endpoint="{_label(endpoint)}"'
+            for bound, count in zip(DURATION_BUCKETS, values['buckets']):
+                lines.append(f'araiza_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'araiza_request_duration_seconds_bucket{{{label},le="+Inf"}} {values["requests"]}')
+            lines.append(f'araiza_request_duration_seconds_sum{{{label}}} {values["seconds"]:.6f}')
+            lines.append(f'araiza_request_duration_seconds_count{{{label}}} {values["requests"]}')
+
+        for name, key, help_text in (
+            ('araiza_sql_queries_total', 'queries', 'SQL statements executed.'),
+            ('araiza_sql_duration_seconds_total', 'query_seconds', 'Time spent in SQL statements.'),
+            ('araiza_template_render_seconds_total', 'render_seconds', 'Time spent rendering templates.'),
+            ('araiza_response_bytes_total', 'response_bytes', 'Response body bytes sent.'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for endpoint, values in sorted(totals.items()):
+                value = values[key]
+                value = f'{value:.6f}' if isinstance(value, float) else value
+                lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {value}')
+
+        page_cache = current_app.extensions.get('page_cache')
+        if page_cache is not None:
+            for name in ('hits', 'misses', 'bypasses', 'not_modified'):
+                lines.append(f'# TYPE araiza_page_cache_{name}_total counter')
+                lines.append(f'araiza_page_cache_{name}_total {getattr(page_cache, name)}')
+
+        ingest = current_app.extensions.get('ingest')
+        if ingest is not None and ingest.enabled:
+            stats = ingest.stats()
+            for name in ('saved', 'rejected'):
+                lines.append(f'# TYPE araiza_ingest_{name}_total counter')
+                lines.append(f'araiza_ingest_{name}_total {stats[name]}')
+            lines.append('# TYPE araiza_ingest_waiting gauge')
+            lines.append(f'araiza_ingest_waiting {stats["waiting"]}')
+
+        replica = current_app.extensions.get('replica')
+        if replica is not None and replica.engine is not None:
+            lines.append('# HELP araiza_replica_routed_total Public GET requests by where their reads went.')
+            lines.append('# TYPE araiza_replica_routed_total counter')
+            for reason, count in sorted(replica.stats().items()):
+                lines.append(f'araiza_replica_routed_total{{route="{reason}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        return current_app.response_class(self.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+metrics = Metrics()
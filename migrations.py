@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Schema Upgrades for Existing Araiza Inc Databases
+
+db.create_all() only creates missing tables, it never alters tables that
+already exist. upgrade_database() compares the models in models.py with the
+live schema and adds whatever is missing (columns, indexes and the search
+index), so databases created by older versions of the site (like
+instance/araiza_inc.db) keep all their data.
+
+It runs automatically from init_database_if_needed(). To apply it by hand:
+    python migrations.py
+"""
+
+from sqlalchemy import inspect, text
+from models import db
+import search
+
+# Statements run right after a column is added, to fill existing rows
+COLUMN_BACKFILLS = {
+    ('categories', 'updated_at'): "UPDATE categories SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)",
+    ('services', 'updated_at'): "UPDATE services SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)",
+    ('portfolio', 'updated_at'): "UPDATE portfolio SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)",
+    ('site_settings', 'updated_at'): "UPDATE site_settings SET updated_at = CURRENT_TIMESTAMP",
+}
+
+def add_missing_columns(connection):
+    """Add model columns that are missing from existing tables"""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            backfill = COLUMN_BACKFILLS.get((table.name, column.name))
+            if backfill:
+                connection.execute(text(backfill))
+            added.append(f'{table.name}.{column.name}')
+
+    return added
+
+def add_missing_indexes(connection):
+    """Create model indexes that are missing from existing tables"""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            index.create(connection)
+            added.append(index.name)
+
+    # Refresh the planner statistics so SQLite starts using the new indexes
+    if added and connection.dialect.name == 'sqlite':
+        connection.execute(text('ANALYZE'))
+    return added
+
+def upgrade_database():
+    """Bring an existing database up to the current models without data loss"""
+    with db.engine.begin() as connection:
+        changes = add_missing_columns(connection)
+        changes += add_missing_indexes(connection)
+        if search.install(connection):
+            changes.append('search index')
+
+    for change in changes:
+        print(f"🔧 Added {change}")
+    return changes
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        db.create_all()
+        changes = upgrade_database()
+        if changes:
+            print(f"✅ Database upgraded ({len(changes)} changes)")
+        else:
+            print("✅ Database schema is up to date")
@@ -1,7 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
+from replica import RoutingSession
 from datetime import datetime
+import json
 
-db = SQLAlchemy()
+# Public GET requests may read from a replica (see replica.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Category(db.Model):
     __tablename__ = 'categories'
@@ -10,6 +13,7 @@ class Category(db.Model):
     nombre = db.Column(db.String(100), nullable=False)
     descripcion = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship with services
     services = db.relationship('Service', backref='category', lazy=True, cascade='all, delete-orphan')
@@ -19,6 +23,9 @@ class Category(db.Model):
 
 class Service(db.Model):
     __tablename__ = 'services'
+    __table_args__ = (
+        db.Index('ix_services_categoria_activo', 'id_categoria', 'activo'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     id_categoria = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
@@ -26,25 +33,42 @@ class Service(db.Model):
     descripcion = db.Column(db.Text)
     precio = db.Column(db.String(50))
     imagen = db.Column(db.String(200))
+    imagen_variantes = db.Column(db.Text)
     activo = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def image_variants(self):
+        """Resized copies of imagen generated by images.py"""
+        return json.loads(self.imagen_variantes) if self.imagen_variantes else []
     
     def __repr__(self):
         return f'<Service {self.nombre}>'
 
 class Portfolio(db.Model):
     __tablename__ = 'portfolio'
+    __table_args__ = (
+        db.Index('ix_portfolio_activo', 'activo'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(100), nullable=False)
     descripcion = db.Column(db.Text)
     imagen = db.Column(db.String(200))
+    imagen_variantes = db.Column(db.Text)
     url = db.Column(db.String(200))
     cliente = db.Column(db.String(100))
     fecha_proyecto = db.Column(db.Date)
     tecnologias = db.Column(db.String(200))
     activo = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def image_variants(self):
+        """Resized copies of imagen generated by images.py"""
+        return json.loads(self.imagen_variantes) if self.imagen_variantes else []
     
     def __repr__(self):
         return f'<Portfolio {self.titulo}>'
@@ -56,12 +80,17 @@ class SiteSettings(db.Model):
     key = db.Column(db.String(50), unique=True, nullable=False)
     value = db.Column(db.Text)
     description = db.Column(db.String(200))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __repr__(self):
         return f'<SiteSettings {self.key}>'
 
 class QuoteRequest(db.Model):
     __tablename__ = 'quote_requests'
+    __table_args__ = (
+        db.Index('ix_quote_requests_estado_created', 'estado', 'created_at'),
+        db.Index('ix_quote_requests_created', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
@@ -85,6 +114,10 @@ class QuoteRequest(db.Model):
 
 class Contact(db.Model):
     __tablename__ = 'contacts'
+    __table_args__ = (
+        db.Index('ix_contacts_estado_created', 'estado', 'created_at'),
+        db.Index('ix_contacts_created', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
@@ -95,4 +128,42 @@ class Contact(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
-        return f'<Contact {self.nombre} - {self.asunto}>'
\ No newline at end of file
+        return f'<Contact {self.nombre} - {self.asunto}>'
+
+class StatCounter(db.Model):
+    __tablename__ = 'stat_counters'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+
+class OutboxMessage(db.Model):
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        db.Index('ix_outbox_estado_siguiente', 'estado', 'siguiente_intento'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    estado = db.Column(db.String(20), default='pendiente')
+    intentos = db.Column(db.Integer, default=0)
+    siguiente_intento = db.Column(db.DateTime, default=datetime.utcnow)
+    ultimo_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    enviado_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<OutboxMessage {self.tipo} - {self.estado}>'
+
+# Journal files of ingest.py whose submissions are already committed
+class IngestSegment(db.Model):
+    __tablename__ = 'ingest_segments'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<IngestSegment {self.name}>'
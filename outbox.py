@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Durable Outbox for Calls to External Services
+
+Form handlers never talk to third-party APIs directly. They add an
+OutboxMessage to the same transaction as the row they save (see enqueue())
+and return right away. A worker drains the outbox in batches over a pooled
+requests.Session with timeouts. Failures are retried with exponential
+backoff, and after OUTBOX_MAX_ATTEMPTS a message is left in the 'fallido'
+(dead-letter) state for manual review.
+
+The worker runs as a daemon thread inside each web process by default
+(OUTBOX_WORKER=thread), started with the process's first request, so
+scripts that import the app never send anything. Set OUTBOX_WORKER=none and
+run it separately with:
+    python outbox.py          # poll forever
+    python outbox.py --once   # drain what is due and exit
+"""
+
+from models import db, OutboxMessage
+from requests.adapters import HTTPAdapter
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import random
+import threading
+import requests
+
+logger = logging.getLogger(__name__)
+
+MAILERLITE_SUBSCRIBE = 'mailerlite.subscribe'
+
+
+class PermanentError(Exception):
+    """A delivery failure that retrying will not fix"""
+
+
+def enqueue(tipo, payload):
+    """Add a message to the current session; it is sent once committed"""
+    message = OutboxMessage(tipo=tipo, payload=json.dumps(payload))
+    db.session.add(message)
+    return message
+
+
+def mailerlite_subscription(email, name):
+    """(tipo, payload) of a MailerLite subscription, or None if not configured"""
+    if not os.getenv('MAILERLITE_API_KEY'):
+        return None
+    return MAILERLITE_SUBSCRIBE, {
+        'email': email,
+        'name': name,
+        'group_id': os.getenv('MAILERLITE_GROUP_ID'),
+    }
+
+
+def enqueue_mailerlite_subscription(email, name):
+    """Queue a MailerLite subscription if MailerLite is configured"""
+    message = mailerlite_subscription(email, name)
+    if message is None:
+        return None
+    return enqueue(*message)
+
+
+def send_mailerlite_subscription(session, payload, timeout):
+    """Add subscriber to MailerLite"""
+    api_key = os.getenv('MAILERLITE_API_KEY')
+    if not api_key:
+        raise PermanentError('MAILERLITE_API_KEY is not set')
+
+    url = os.getenv('MAILERLITE_API_URL', 'https://api.mailerlite.com/api/v2/subscribers')
+    headers = {
+        'X-MailerLite-ApiKey': api_key,
+        'Content-Type': 'application/json'
+    }
+    data = {
+        'email': payload['email'],
+        'name': payload['name'],
+        'groups': [payload['group_id']] if payload.get('group_id') else []
+    }
+
+    response = session.post(url, json=data, headers=headers, timeout=timeout)
+    if response.status_code == 429 or response.status_code >= 500:
+        raise RuntimeError(f'MailerLite HTTP {response.status_code}')
+    if response.status_code >= 400:
+        raise PermanentError(f'MailerLite HTTP {response.status_code}: {response.text[:200]}')
+
+
+HANDLERS = {
+    MAILERLITE_SUBSCRIBE: send_mailerlite_subscription,
+}
+
+
+class OutboxWorker:
+    """Deliver due outbox messages in batches"""
+
+    def __init__(self, batch_size=50, max_attempts=8, base_delay=30, max_delay=3600,
+                 lease=300, connect_timeout=3.05, read_timeout=10):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            batch_size=int(config.get('OUTBOX_BATCH_SIZE', 50)),
+            max_attempts=int(config.get('OUTBOX_MAX_ATTEMPTS', 8)),
+            base_delay=float(config.get('OUTBOX_BASE_DELAY', 30)),
+            max_delay=float(config.get('OUTBOX_MAX_DELAY', 3600)),
+            read_timeout=float(config.get('OUTBOX_HTTP_TIMEOUT', 10)),
+        )
+
+    def backoff(self, attempts):
+        """Delay before the next attempt, with jitter"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def claim_batch(self):
+        """Lease up to batch_size due messages so no other worker sends them"""
+        now = datetime.utcnow()
+        candidates = db.session.query(OutboxMessage.id).filter(
+            OutboxMessage.estado == 'pendiente',
+            OutboxMessage.siguiente_intento <= now
+        ).order_by(OutboxMessage.siguiente_intento, OutboxMessage.id).limit(self.batch_size).all()
+
+        claimed = []
+        lease_until = now + timedelta(seconds=self.lease)
+        for (message_id,) in candidates:
+            # The lease doubles as crash recovery: an unfinished message
+            # becomes due again once it expires
+            updated = OutboxMessage.query.filter(
+                OutboxMessage.id == message_id,
+                OutboxMessage.estado == 'pendiente',
+                OutboxMessage.siguiente_intento <= now
+            ).update({'siguiente_intento': lease_until}, synchronize_session=False)
+            if updated:
+                claimed.append(message_id)
+        db.session.commit()
+
+        if not claimed:
+            return []
+        return OutboxMessage.query.filter(OutboxMessage.id.in_(claimed)).order_by(OutboxMessage.id).all()
+
+    def deliver(self, message):
+        handler = HANDLERS.get(message.tipo)
+        message.intentos = (message.intentos or 0) + 1
+        try:
+            if handler is None:
+                raise PermanentError(f'No handler for {message.tipo}')
+            handler(self.session, json.loads(message.payload), self.timeout)
+        except Exception as e:
+            message.ultimo_error = str(e)[:1000]
+            if isinstance(e, PermanentError) or message.intentos >= self.max_attempts:
+                message.estado = 'fallido'
+                logger.warning('Outbox message %s dead-lettered: %s', message.id, e)
+            else:
+                message.siguiente_intento = datetime.utcnow() + timedelta(seconds=self.backoff(message.intentos))
+            return False
+
+        message.estado = 'enviado'
+        message.enviado_at = datetime.utcnow()
+        message.ultimo_error = None
+        return True
+
+    def run_once(self):
+        """Deliver one batch; return the number of messages processed"""
+        batch = self.claim_batch()
+        for message in batch:
+            self.deliver(message)
+        if batch:
+            db.session.commit()
+        return len(batch)
+
+    def drain(self):
+        """Deliver batches until nothing is due"""
+        total = 0
+        while True:
+            processed = self.run_once()
+            total += processed
+            if processed < self.batch_size:
+                return total
+
+
+def run_forever(app, worker, poll_interval=5, stop_event=None):
+    stop_event = stop_event or threading.Event()
+    # Wait one interval first so the app can finish creating its tables
+    while not stop_event.wait(poll_interval):
+        try:
+            with app.app_context():
+                worker.drain()
+        except Exception:
+            logger.exception('Outbox worker iteration failed')
+
+
+def start_worker_thread(app):
+    """Run the outbox worker in a daemon thread of this process"""
+    worker = OutboxWorker.from_config(app.config)
+    poll_interval = float(app.config.get('OUTBOX_POLL_INTERVAL', 5))
+    thread = threading.Thread(target=run_forever, args=(app, worker, poll_interval),
+                              name='outbox-worker', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    import sys
+    # This process is the worker; don't start another one inside the app
+    os.environ['OUTBOX_WORKER'] = 'none'
+    from app import app
+
+    logging.basicConfig(level=logging.INFO)
+    worker = OutboxWorker.from_config(app.config)
+    if '--once' in sys.argv:
+        with app.app_context():
+            print(f"📨 Processed {worker.drain()} outbox messages")
+    else:
+        print("📨 Outbox worker running (Ctrl+C to stop)")
+        run_forever(app, worker, float(app.config.get('OUTBOX_POLL_INTERVAL', 5)))
@@ -0,0 +1,427 @@
+"""Full-page response cache for the public routes.
+
+Entries are keyed on path plus the query arguments the view reads (so
+``/?x=1`` is the same entry as ``/``) and remember the versions of the
+cache tags (see cache.py) they were rendered under. An entry whose tags have
+changed since is treated as a miss, so an ``invalidate('services')`` issued
+by any worker retires the affected pages everywhere. Requests with pending
+flash messages and non-GET requests always bypass the cache.
+
+The same tag versions give every cached route an ``ETag`` and a
+``Last-Modified`` date, so revalidating clients get a ``304 Not Modified``
+before the view runs at all. When compression is enabled, entries also keep
+their gzip/brotli bodies (see compression.py).
+
+Tag stamps and model timestamps outlive a deploy, so the versions also
+include the deploy version (see deploy_version()): pages rendered by the
+previous templates and code are neither served from the cache nor
+revalidated with a 304 after a restart.
+"""
+from flask import current_app, request, session, make_response
+from werkzeug.http import is_resource_modified
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from urllib.parse import urlencode
+import hashlib
+import os
+import pickle
+import threading
+
+from cache import CachedLoader, tag_timestamp, tag_versions, tags_invalidated
+
+# Rough per-entry bookkeeping cost added to the body size
+ENTRY_OVERHEAD = 256
+
+
+def deploy_version(app):
+    """(version, deployed_at) of the templates and code an app serves
+
+    The version is PAGE_CACHE_VERSION when set (e.g. the commit being
+    deployed), else a hash of the mtimes of the templates and of the
+    modules next to the app. deployed_at is the newest of those mtimes
+    (naive UTC).
+    """
+    paths = [os.path.join(app.root_path, name) for name in os.listdir(app.root_path) if name.endswith('.py')]
+    for root, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        paths.extend(os.path.join(root, name) for name in files)
+    stamps = sorted((os.path.relpath(path, app.root_path), os.path.getmtime(path)) for path in paths)
+    version = app.config.get('PAGE_CACHE_VERSION') or hashlib.sha1(repr(stamps).encode()).hexdigest()[:16]
+    deployed_at = max((mtime for _, mtime in stamps), default=None)
+    return version, deployed_at and datetime.utcfromtimestamp(deployed_at)
+
+
+class MemoryBackend:
+    """In-process LRU bounded by the total size of the cached bodies"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        size = entry['size']
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old['size']
+            self._entries[key] = entry
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted['size']
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry['size']
+
+    def purge(self, tags):
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if tags & set(entry['tags'])]
+            for key in stale:
+                self.bytes -= self._entries.pop(key)['size']
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {'entries': len(self._entries), 'bytes': self.bytes,
+                'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+
+class FileSystemBackend:
+    """On-disk LRU shared by every worker on the host
+
+    Reads refresh a file's mtime; once the directory outgrows ``max_bytes``
+    the least recently used files are removed. Each worker rescans the
+    directory after writing a tenth of the budget, so the total can only
+    overshoot by that much per worker.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._written = max_bytes  # scan on the first write
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.page')
+
+    def _entries(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.page'):
+                yield os.path.join(self.directory, name)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return entry if entry.get('key') == key else None
+
+    def set(self, key, entry):
+        if entry['size'] > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(dict(entry, key=key), f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._written += size
+            if self._written < self.max_bytes // 10:
+                return
+            self._written = 0
+        self._evict()
+
+    def _evict(self):
+        files = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def purge(self, tags):
+        purged = 0
+        for path in self._entries():
+            try:
+                with open(path, 'rb') as f:
+                    entry = pickle.load(f)
+                if tags & set(entry['tags']):
+                    os.remove(path)
+                    purged += 1
+            except (OSError, EOFError, pickle.UnpicklingError):
+                continue
+        return purged
+
+    def clear(self):
+        for path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        entries = 0
+        size = 0
+        for path in self._entries():
+            try:
+                size += os.path.getsize(path)
+                entries += 1
+            except FileNotFoundError:
+                continue
+        return {'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes,
+                'evictions': self.evictions, 'directory': self.directory}
+
+
+class PageCache:
+    """Cache rendered GET responses and drop them when their tags change"""
+
+    def __init__(self, app=None, layout_tags=()):
+        self.layout_tags = tuple(layout_tags)
+        self.backend = None
+        self.version = None
+        self.deployed_at = None
+        self._timestamps = {}
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.not_modified = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PAGE_CACHE_BACKEND', 'memory')
+        app.config.setdefault('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+        app.config.setdefault('PAGE_CACHE_DIR', os.path.join(app.instance_path, 'page_cache'))
+        app.config.setdefault('PAGE_CACHE_VERSION', None)
+        # Once per process: a deploy restarts the workers
+        self.version, self.deployed_at = deploy_version(app)
+
+        backend = app.config['PAGE_CACHE_BACKEND']
+        if backend == 'memory':
+            self.backend = MemoryBackend(int(app.config['PAGE_CACHE_MAX_BYTES']))
+        elif backend == 'filesystem':
+            self.backend = FileSystemBackend(app.config['PAGE_CACHE_DIR'], int(app.config['PAGE_CACHE_MAX_BYTES']))
+        elif backend in ('none', 'null', '', None):
+            self.backend = None
+        else:
+            raise ValueError(f'Unknown PAGE_CACHE_BACKEND: {backend}')
+
+        tags_invalidated.connect(self._on_invalidate, weak=False)
+        app.extensions['page_cache'] = self
+
+    def _on_invalidate(self, sender, tags):
+        self.purge(*tags)
+
+    def register_timestamp(self, tag, loader):
+        """Use ``loader()`` as the last model change behind a tag"""
+        self._timestamps[tag] = CachedLoader(loader, tag)
+
+    def last_modified(self, tags):
+        """Latest model timestamp, invalidation or deploy among the given tags"""
+        candidates = [self.deployed_at]
+        for tag in tags:
+            candidates.append(tag_timestamp(tag))
+            if tag in self._timestamps:
+                candidates.append(self._timestamps[tag].get())
+        return max(filter(None, candidates), default=None)
+
+    @staticmethod
+    def make_etag(key, versions):
+        return hashlib.sha1(repr((key, versions)).encode()).hexdigest()[:32]
+
+    def _should_bypass(self):
+        if request.method not in ('GET', 'HEAD'):
+            return True
+        # Only look inside the session when there is one, so anonymous
+        # visitors don't get a "Vary: Cookie" header
+        if current_app.config['SESSION_COOKIE_NAME'] in request.cookies:
+            return '_flashes' in session
+        return False
+
+    @staticmethod
+    def make_key(query_args=()):
+        """Path plus the given query arguments; any other argument is ignored"""
+        values = sorted((name, value) for name in query_args for value in request.args.getlist(name))
+        return request.path + ('?' + urlencode(values) if values else '')
+
+    def cached(self, *tags, layout=True, query_args=()):
+        """Decorator caching a view's 200 responses under the given tags
+
+        Pages that extend base.html also depend on the layout tags; pass
+        ``layout=False`` for responses that don't, such as JSON endpoints.
+        ``query_args`` names the query arguments the view reads; they are the
+        only ones that make a separate entry.
+        """
+        if layout:
+            tags = self.layout_tags + tuple(tag for tag in tags if tag not in self.layout_tags)
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self._should_bypass():
+                    self.bypasses += 1
+                    return view(*args, **kwargs)
+
+                key = self.make_key(query_args)
+                versions = (self.version,) + tag_versions(*tags)
+                etag = self.make_etag(key, versions)
+                last_modified = self.last_modified(tags)
+
+                if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                    self.not_modified += 1
+                    response = current_app.response_class(status=304)
+                    return self._add_validators(response, etag, last_modified)
+
+                entry = self.backend.get(key) if self.backend is not None else None
+                if entry is not None and entry['versions'] == versions:
+                    self.hits += 1
+                    response = current_app.response_class(
+                        entry['body'], status=200, headers=entry['headers'])
+                    self._use_encoded(response, entry.get('encoded', {}))
+                    response.headers['X-Cache'] = 'HIT'
+                    return self._add_validators(response, etag, last_modified)
+
+                response = make_response(view(*args, **kwargs))
+                if self.backend is not None:
+                    self.misses += 1
+                    if self._is_cacheable(response):
+                        self._store(key, response, tags, versions)
+                    response.headers['X-Cache'] = 'MISS'
+                if response.status_code == 200:
+                    self._add_validators(response, etag, last_modified)
+                return response
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _add_validators(response, etag, last_modified):
+        # Weak, because compression may change the bytes on the wire
+        response.set_etag(etag, weak=True)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        # Let browsers keep the page but revalidate it on every visit
+        response.cache_control.no_cache = True
+        return response
+
+    def _store(self, key, response, tags, versions):
+        backend = self.backend
+        headers = [(name, value) for name, value in response.headers
+                   if name.lower() not in ('content-length', 'set-cookie')]
+        # Compress once per encoding when storing, so hits never compress
+        compression = current_app.extensions.get('compression')
+        if compression is not None and not compression.is_compressible(response):
+            compression = None
+
+        def save(body):
+            encoded = compression.encode_all(body) if compression is not None else {}
+            backend.set(key, {
+                'body': body,
+                'encoded': encoded,
+                'headers': headers,
+                'tags': tags,
+                'versions': versions,
+                'size': len(body) + sum(map(len, encoded.values())) + len(key) + ENTRY_OVERHEAD,
+            })
+            return encoded
+
+        if not response.is_streamed:
+            self._use_encoded(response, save(response.get_data()))
+            return
+
+        # Streamed pages are copied as they are sent and stored only once
+        # complete; an aborted download leaves nothing behind
+        chunks = response.iter_encoded()
+
+        def tee():
+            body = []
+            for chunk in chunks:
+                body.append(chunk)
+                yield chunk
+            save(b''.join(body))
+
+        response.response = tee()
+
+    @staticmethod
+    def _use_encoded(response, encoded):
+        """Serve a stored compressed body when the client accepts one"""
+        if not encoded:
+            return response
+        compression = current_app.extensions['compression']
+        encoding = compression.negotiate()
+        if encoding in encoded:
+            compression.apply(response, encoded[encoding], encoding)
+        return response
+
+    @staticmethod
+    def _is_cacheable(response):
+        return response.status_code == 200 and 'Set-Cookie' not in response.headers
+
+    def purge(self, *tags):
+        """Drop every local entry depending on any of the given tags"""
+        if self.backend is None:
+            return 0
+        return self.backend.purge(set(tags))
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'backend': type(self.backend).__name__ if self.backend else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'bypasses': self.bypasses,
+            'not_modified': self.not_modified,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+        if self.backend is not None:
+            stats.update(self.backend.stats())
+        return stats
+
+
+page_cache = PageCache(layout_tags=('settings', 'services', 'assets'))
@@ -0,0 +1,78 @@
+"""Keyset (cursor) pagination for the admin listings.
+
+OFFSET pagination makes SQLite walk and discard every row before the
+requested page and runs a COUNT(*) on each view. Here each page remembers
+the ``(created_at, id)`` of its first and last rows and the next query seeks
+straight past them through the (estado, created_at) indexes. Page 50,000
+therefore costs the same as page 1. Cursors are opaque URL-safe tokens.
+"""
+from sqlalchemy import and_, or_
+from datetime import datetime
+import base64
+import binascii
+import json
+
+
+def encode_cursor(item, direction):
+    data = {'c': item.created_at.isoformat(), 'i': item.id, 'd': direction}
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (created_at, id, direction), or None for a missing/bad token"""
+    if not token:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        direction = data['d'] if data['d'] in ('next', 'prev') else 'next'
+        return datetime.fromisoformat(data['c']), int(data['i']), direction
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """One page of a newest-first listing"""
+
+    def __init__(self, items, per_page, has_next, has_prev, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = has_prev
+        # Approximate: read from the dashboard counters, not a COUNT(*)
+        self.total = total
+        self.next_cursor = encode_cursor(items[-1], 'next') if has_next and items else None
+        self.prev_cursor = encode_cursor(items[0], 'prev') if has_prev and items else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(query, model, cursor=None, per_page=20, total=None):
+    """Paginate ``query`` newest-first on (model.created_at, model.id)"""
+    created_at, id_column = model.created_at, model.id
+    position = decode_cursor(cursor)
+
+    if position is None:
+        rows = query.order_by(created_at.desc(), id_column.desc()).limit(per_page + 1).all()
+        return KeysetPage(rows[:per_page], per_page, has_next=len(rows) > per_page,
+                          has_prev=False, total=total)
+
+    value, last_id, direction = position
+    if direction == 'next':
+        rows = query.filter(or_(
+            created_at < value,
+            and_(created_at == value, id_column < last_id)
+        )).order_by(created_at.desc(), id_column.desc()).limit(per_page + 1).all()
+        return KeysetPage(rows[:per_page], per_page, has_next=len(rows) > per_page,
+                          has_prev=True, total=total)
+
+    rows = query.filter(or_(
+        created_at > value,
+        and_(created_at == value, id_column > last_id)
+    )).order_by(created_at.asc(), id_column.asc()).limit(per_page + 1).all()
+    items = list(reversed(rows[:per_page]))
+    return KeysetPage(items, per_page, has_next=True,
+                      has_prev=len(rows) > per_page, total=total)
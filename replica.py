@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Read Replica Routing for the Public Pages
+
+With a replica configured, the ORM reads of public GET requests go to it,
+while form posts, the admin panel, background threads and every write keep
+using the primary database (SQLALCHEMY_DATABASE_URI). The routing happens
+in RoutingSession.get_bind(), so views keep using db.session unchanged.
+
+There are two kinds of replica:
+
+    READ_REPLICA_SNAPSHOT=replica.db     a read-only SQLite copy of the primary
+                                         (relative paths are in instance/)
+    READ_REPLICA_URL=postgresql://...    a second database kept in sync elsewhere
+
+A snapshot is taken with the SQLite backup API and swapped in atomically:
+    python replica.py snapshot
+or every READ_REPLICA_SNAPSHOT_INTERVAL seconds by a thread the app starts
+with its first request (on one process is enough; the file is shared). It
+remembers the versions of the cache tags (see cache.py) it was taken at,
+and is only used while they are current: after an edit in the admin, public
+reads go to the primary until the next snapshot, so the page cache never
+stores stale pages. A READ_REPLICA_URL replica can't be checked that way;
+public reads go to the primary for READ_REPLICA_MAX_LAG seconds after every
+catalogue change.
+
+A client whose request committed something reads from the primary for
+READ_REPLICA_STICKY_SECONDS afterwards (read-your-writes for the admin and
+whoever just sent a form).
+
+Usage:
+    python replica.py snapshot   # take a snapshot now
+    python replica.py status     # where public reads go, and why
+"""
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.sql.dml import UpdateBase
+from datetime import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from cache import tag_timestamp, tag_versions
+import background
+
+logger = logging.getLogger(__name__)
+
+# Cache tags covering everything the public pages read
+TAGS = ('settings', 'services', 'portfolio')
+
+# Table inside each snapshot with the tag versions it was taken at
+SNAPSHOT_TABLE = 'replica_snapshot'
+
+
+class RoutingSession(Session):
+    """Session sending the reads of replica-eligible requests to the replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase):
+            engine = g.get('_read_replica') if has_request_context() else None
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _snapshot_versions(path):
+    """Tag versions recorded in a snapshot file, or None if there is none"""
+    try:
+        connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        return dict(connection.execute(f'SELECT tag, version FROM {SNAPSHOT_TABLE}'))
+    except sqlite3.Error:
+        return None
+    finally:
+        connection.close()
+
+
+class ReadReplica:
+    """Route the reads of public GET requests to a read replica"""
+
+    def __init__(self, app=None):
+        self.engine = None
+        self.snapshot_path = None
+        self.routed = {'replica': 0, 'stale': 0, 'sticky': 0}
+        self._snapshot = (None, None)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('READ_REPLICA_URL', '')
+        app.config.setdefault('READ_REPLICA_SNAPSHOT', '')
+        app.config.setdefault('READ_REPLICA_SNAPSHOT_INTERVAL', 0)
+        app.config.setdefault('READ_REPLICA_MAX_LAG', 5)
+        app.config.setdefault('READ_REPLICA_STICKY_SECONDS', 30)
+        app.extensions['replica'] = self
+
+        url = app.config['READ_REPLICA_URL']
+        snapshot = app.config['READ_REPLICA_SNAPSHOT']
+        if url and snapshot:
+            raise ValueError('Set READ_REPLICA_URL or READ_REPLICA_SNAPSHOT, not both')
+        if snapshot:
+            self.snapshot_path = os.path.join(app.instance_path, snapshot)
+            # immutable: a snapshot file is never changed, only replaced
+            url = f'sqlite:///file:{self.snapshot_path}?mode=ro&immutable=1&uri=true'
+        if not url:
+            return
+
+        # Not at the top: models.py imports this module for RoutingSession
+        import sqlite_tuning
+        self.engine = create_engine(url, **sqlite_tuning.engine_options(dict(app.config, SQLALCHEMY_DATABASE_URI=url)))
+        if url.startswith('sqlite'):
+            sqlite_tuning.apply_pragmas(self.engine, sqlite_tuning.connection_pragmas(app.config, url, read_only=True))
+        if self.snapshot_path:
+            event.listen(self.engine, 'connect', self._remember_file)
+            event.listen(self.engine, 'checkout', self._check_file)
+        sqlite_tuning.dispose_after_fork(self.engine)
+        if 'metrics' in app.extensions:
+            app.extensions['metrics'].watch(self.engine)
+
+        with app.app_context():
+            from models import db
+            event.listen(db.engine, 'commit', self._on_primary_commit)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        interval = float(app.config['READ_REPLICA_SNAPSHOT_INTERVAL'])
+        if self.snapshot_path and interval > 0:
+            background.on_first_request(app, self._start_snapshot_thread, app, interval)
+
+    def _file_id(self):
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _remember_file(self, dbapi_connection, connection_record):
+        connection_record.info['file_id'] = self._file_id()
+
+    def _check_file(self, dbapi_connection, connection_record, connection_proxy):
+        # Pooled connections still read the replaced file; reconnect
+        if connection_record.info.get('file_id') != self._file_id():
+            raise exc.DisconnectionError('Replica snapshot was replaced')
+
+    def snapshot_versions(self):
+        """Tag versions of the current snapshot file (cached per file)"""
+        file_id = self._file_id()
+        if file_id is None:
+            return None
+        cached_id, versions = self._snapshot
+        if cached_id != file_id:
+            versions = _snapshot_versions(self.snapshot_path)
+            self._snapshot = (file_id, versions)
+        return versions
+
+    def is_fresh(self):
+        """Whether the replica has every catalogue change the primary has"""
+        if self.snapshot_path:
+            versions = self.snapshot_versions()
+            return versions is not None and tuple(versions.get(tag) for tag in TAGS) == tag_versions(*TAGS)
+        changed = max(filter(None, (tag_timestamp(tag) for tag in TAGS)), default=None)
+        max_lag = float(current_app.config['READ_REPLICA_MAX_LAG'])
+        return changed is None or (datetime.utcnow() - changed).total_seconds() > max_lag
+
+    @staticmethod
+    def _is_sticky():
+        # Only look inside the session when there is one (see page_cache.py)
+        if current_app.config['SESSION_COOKIE_NAME'] not in request.cookies:
+            return False
+        return session.get('_primary_until', 0) > time.time()
+
+    def _before_request(self):
+        if request.method not in ('GET', 'HEAD') or request.blueprint == 'admin':
+            return
+        if request.endpoint in (None, 'static', 'metrics'):
+            return
+        if self._is_sticky():
+            reason = 'sticky'
+        elif not self.is_fresh():
+            reason = 'stale'
+        else:
+            reason = 'replica'
+            g._read_replica = self.engine
+        with self._lock:
+            self.routed[reason] += 1
+
+    @staticmethod
+    def _on_primary_commit(connection):
+        if has_request_context():
+            g._primary_committed = True
+
+    def _after_request(self, response):
+        if g.get('_primary_committed'):
+            session['_primary_until'] = time.time() + float(current_app.config['READ_REPLICA_STICKY_SECONDS'])
+        return response
+
+    def snapshot(self):
+        """Copy the primary SQLite database to the snapshot file; return its size"""
+        from models import db
+
+        if db.engine.dialect.name != 'sqlite':
+            raise RuntimeError('Snapshots need a SQLite primary; use READ_REPLICA_URL instead')
+        # Read before copying: a change during the copy leaves the snapshot
+        # marked older than it is, never newer
+        versions = dict(zip(TAGS, tag_versions(*TAGS)))
+        tmp_path = f'{self.snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        raw = db.engine.raw_connection()
+        try:
+            target = sqlite3.connect(tmp_path)
+            try:
+                raw.driver_connection.backup(target)
+                # A standalone file: no -wal/-shm that could outlive a swap
+                target.execute('PRAGMA journal_mode=DELETE')
+                target.execute(f'DROP TABLE IF EXISTS {SNAPSHOT_TABLE}')
+                target.execute(f'CREATE TABLE {SNAPSHOT_TABLE} (tag TEXT PRIMARY KEY, version TEXT)')
+                target.executemany(f'INSERT INTO {SNAPSHOT_TABLE} VALUES (?, ?)', versions.items())
+                target.commit()
+            finally:
+                target.close()
+        finally:
+            raw.close()
+        os.replace(tmp_path, self.snapshot_path)
+        return os.path.getsize(self.snapshot_path)
+
+    def _start_snapshot_thread(self, app, interval):
+        threading.Thread(target=self._snapshot_loop, args=(app, interval),
+                         name='replica-snapshot', daemon=True).start()
+
+    def _snapshot_loop(self, app, interval):
+        stop_event = threading.Event()
+        while True:
+            try:
+                with app.app_context():
+                    # Only copy when the catalogue changed since the last one
+                    if not self.is_fresh():
+                        self.snapshot()
+            except Exception:
+                logger.exception('Replica snapshot failed')
+            if stop_event.wait(interval):
+                return
+
+    def stats(self):
+        with self._lock:
+            return dict(self.routed)
+
+
+replica = ReadReplica()
+
+
+if __name__ == '__main__':
+    import sys
+    os.environ['OUTBOX_WORKER'] = 'none'
+    os.environ['READ_REPLICA_SNAPSHOT_INTERVAL'] = '0'
+    from app import app
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    with app.app_context():
+        if replica.engine is None:
+            print("ℹ️  No replica configured (READ_REPLICA_SNAPSHOT or READ_REPLICA_URL)")
+        elif command == 'snapshot':
+            if not replica.snapshot_path:
+                print("❌ READ_REPLICA_SNAPSHOT is not set")
+                sys.exit(1)
+            started = time.perf_counter()
+            size = replica.snapshot()
+            print(f"✅ Snapshot of {size / 1024 / 1024:.1f} MB written to {replica.snapshot_path} "
+                  f"in {time.perf_counter() - started:.1f}s")
+        else:
+            target = replica.snapshot_path or replica.engine.url.render_as_string(hide_password=True)
+            state = 'up to date' if replica.is_fresh() else 'behind; public reads use the primary'
+            print(f"📊 Replica {target}: {state}")
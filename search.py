@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Full-Text Search over Services and Portfolio Projects
+
+Active services and portfolio projects are indexed in two SQLite FTS5
+tables whose rowid is the record id, and their names again in two small
+name-only tables:
+
+    search_services         nombre, descripcion, categoria
+    search_portfolio        titulo, descripcion, tecnologias
+    search_services_names   nombre
+    search_portfolio_names  titulo
+
+Triggers on services, portfolio and categories keep them in sync with every
+write, including set-based UPDATEs that bypass the ORM. The unicode61
+tokenizer with remove_diacritics folds accents, so "automatizacion" finds
+"Automatización". The last word of a query is matched as a prefix for
+typeahead. Rows whose name matches come first, shortest names first, read
+from the name tables that keep their rows in that order; the other matches
+are ranked with bm25 only when those don't fill the page (see _search()),
+so a broad prefix like "ser" doesn't rank the whole catalogue.
+
+The tables and triggers are created by migrations.py. To rebuild the index
+from the source tables:
+    python search.py rebuild
+"""
+
+from flask import url_for
+from markupsafe import Markup, escape
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import joinedload
+from models import db, Service, Portfolio
+from contextlib import contextmanager
+import re
+import unicodedata
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+
+# name, description, category/technologies
+SERVICE_WEIGHTS = (10.0, 1.0, 4.0)
+PORTFOLIO_WEIGHTS = (10.0, 1.0, 4.0)
+
+# Extra words of a query beyond this are ignored
+MAX_TERMS = 8
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Words of the description shown under each /buscar result
+SNIPPET_WORDS = 16
+SNIPPET_RE = re.compile(r'\w+(?:\W+\w+){0,%d}' % (SNIPPET_WORDS - 1))
+
+# Other matches ranked with bm25 when the names don't fill a page; the
+# newest ones, since ranking all matches of a short prefix is too slow
+RANKED_CANDIDATES = 100
+
+# The name tables' rowid is the name's length times NAME_KEY plus the
+# record id (ids stay below NAME_KEY), so reading them in rowid order
+# yields the shortest names (closest to what was typed) first, new or old,
+# without ranking anything
+NAME_KEY = 2 ** 32
+
+SCHEMA = [
+    f"""CREATE VIRTUAL TABLE search_services USING fts5(
+        nombre, descripcion, categoria, tokenize="{TOKENIZER}", prefix='2 3 4')""",
+    f"""CREATE VIRTUAL TABLE search_portfolio USING fts5(
+        titulo, descripcion, tecnologias, tokenize="{TOKENIZER}", prefix='2 3 4')""",
+    f"""CREATE VIRTUAL TABLE search_services_names USING fts5(
+        nombre, tokenize="{TOKENIZER}", prefix='2 3 4', detail=none)""",
+    f"""CREATE VIRTUAL TABLE search_portfolio_names USING fts5(
+        titulo, tokenize="{TOKENIZER}", prefix='2 3 4', detail=none)""",
+    "INSERT INTO search_services(search_services, rank) VALUES ('rank', 'bm25(%s, %s, %s)')" % SERVICE_WEIGHTS,
+    "INSERT INTO search_portfolio(search_portfolio, rank) VALUES ('rank', 'bm25(%s, %s, %s)')" % PORTFOLIO_WEIGHTS,
+
+    f"""CREATE TRIGGER search_services_insert AFTER INSERT ON services WHEN new.activo BEGIN
+        INSERT INTO search_services(rowid, nombre, descripcion, categoria)
+        VALUES (new.id, new.nombre, new.descripcion,
+                (SELECT nombre FROM categories WHERE id = new.id_categoria));
+        INSERT INTO search_services_names(rowid, nombre)
+        VALUES (length(new.nombre) * {NAME_KEY} + new.id, new.nombre);
+    END""",
+    f"""CREATE TRIGGER search_services_update AFTER UPDATE ON services BEGIN
+        DELETE FROM search_services WHERE rowid = old.id;
+        DELETE FROM search_services_names WHERE rowid = length(old.nombre) * {NAME_KEY} + old.id;
+        INSERT INTO search_services(rowid, nombre, descripcion, categoria)
+        SELECT new.id, new.nombre, new.descripcion,
+               (SELECT nombre FROM categories WHERE id = new.id_categoria)
+        WHERE new.activo;
+        INSERT INTO search_services_names(rowid, nombre)
+        SELECT length(new.nombre) * {NAME_KEY} + new.id, new.nombre WHERE new.activo;
+    END""",
+    f"""CREATE TRIGGER search_services_delete AFTER DELETE ON services BEGIN
+        DELETE FROM search_services WHERE rowid = old.id;
+        DELETE FROM search_services_names WHERE rowid = length(old.nombre) * {NAME_KEY} + old.id;
+    END""",
+    """CREATE TRIGGER search_categories_update AFTER UPDATE OF nombre ON categories BEGIN
+        UPDATE search_services SET categoria = new.nombre
+        WHERE rowid IN (SELECT id FROM services WHERE id_categoria = new.id AND activo);
+    END""",
+
+    f"""CREATE TRIGGER search_portfolio_insert AFTER INSERT ON portfolio WHEN new.activo BEGIN
+        INSERT INTO search_portfolio(rowid, titulo, descripcion, tecnologias)
+        VALUES (new.id, new.titulo, new.descripcion, new.tecnologias);
+        INSERT INTO search_portfolio_names(rowid, titulo)
+        VALUES (length(new.titulo) * {NAME_KEY} + new.id, new.titulo);
+    END""",
+    f"""CREATE TRIGGER search_portfolio_update AFTER UPDATE ON portfolio BEGIN
+        DELETE FROM search_portfolio WHERE rowid = old.id;
+        DELETE FROM search_portfolio_names WHERE rowid = length(old.titulo) * {NAME_KEY} + old.id;
+        INSERT INTO search_portfolio(rowid, titulo, descripcion, tecnologias)
+        SELECT new.id, new.titulo, new.descripcion, new.tecnologias WHERE new.activo;
+        INSERT INTO search_portfolio_names(rowid, titulo)
+        SELECT length(new.titulo) * {NAME_KEY} + new.id, new.titulo WHERE new.activo;
+    END""",
+    f"""CREATE TRIGGER search_portfolio_delete AFTER DELETE ON portfolio BEGIN
+        DELETE FROM search_portfolio WHERE rowid = old.id;
+        DELETE FROM search_portfolio_names WHERE rowid = length(old.titulo) * {NAME_KEY} + old.id;
+    END""",
+]
+
+TABLES = ('search_services', 'search_portfolio', 'search_services_names', 'search_portfolio_names')
+
+def rebuild_index(connection):
+    """Refill the search tables from services, categories and portfolio"""
+    connection.execute(text("DELETE FROM search_services"))
+    connection.execute(text("""
+        INSERT INTO search_services(rowid, nombre, descripcion, categoria)
+        SELECT services.id, services.nombre, services.descripcion, categories.nombre
+        FROM services LEFT JOIN categories ON categories.id = services.id_categoria
+        WHERE services.activo"""))
+    connection.execute(text("DELETE FROM search_portfolio"))
+    connection.execute(text("""
+        INSERT INTO search_portfolio(rowid, titulo, descripcion, tecnologias)
+        SELECT id, titulo, descripcion, tecnologias FROM portfolio WHERE activo"""))
+    connection.execute(text("DELETE FROM search_services_names"))
+    connection.execute(text(f"""
+        INSERT INTO search_services_names(rowid, nombre)
+        SELECT length(nombre) * {NAME_KEY} + id, nombre FROM services WHERE activo ORDER BY 1"""))
+    connection.execute(text("DELETE FROM search_portfolio_names"))
+    connection.execute(text(f"""
+        INSERT INTO search_portfolio_names(rowid, titulo)
+        SELECT length(titulo) * {NAME_KEY} + id, titulo FROM portfolio WHERE activo ORDER BY 1"""))
+    for table in TABLES:
+        connection.execute(text(f"INSERT INTO {table}({table}) VALUES ('optimize')"))
+
+TRIGGER_RE = re.compile(r'CREATE TRIGGER (\w+)')
+
+TRIGGERS = {TRIGGER_RE.match(statement).group(1): statement
+            for statement in SCHEMA if TRIGGER_RE.match(statement)}
+
+def is_installed(connection):
+    return connection.dialect.name == 'sqlite' and connection.execute(text(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN :names"
+    ).bindparams(bindparam('names', expanding=True)), {'names': TABLES}).scalar() == len(TABLES)
+
+# Statements re-indexing the ids in the temp table search_reindex. Rows
+# indexed with their current text are left alone, and each name entry is
+# found through the main table, which still holds the name it was indexed
+# under
+REINDEX = [
+    """DELETE FROM search_reindex WHERE kind = 'services' AND id IN (
+        SELECT services.id FROM search_reindex JOIN services ON services.id = search_reindex.id
+        LEFT JOIN categories ON categories.id = services.id_categoria
+        JOIN search_services ON search_services.rowid = services.id
+        WHERE search_reindex.kind = 'services' AND services.activo
+          AND search_services.nombre IS services.nombre
+          AND search_services.descripcion IS services.descripcion
+          AND search_services.categoria IS categories.nombre)""",
+    f"""DELETE FROM search_services_names WHERE rowid IN (
+        SELECT length(nombre) * {NAME_KEY} + rowid FROM search_services
+        WHERE rowid IN (SELECT id FROM search_reindex WHERE kind = 'services'))""",
+    "DELETE FROM search_services WHERE rowid IN (SELECT id FROM search_reindex WHERE kind = 'services')",
+    """INSERT INTO search_services(rowid, nombre, descripcion, categoria)
+        SELECT services.id, services.nombre, services.descripcion, categories.nombre
+        FROM search_reindex JOIN services ON services.id = search_reindex.id
+        LEFT JOIN categories ON categories.id = services.id_categoria
+        WHERE search_reindex.kind = 'services' AND services.activo ORDER BY 1""",
+    f"""INSERT INTO search_services_names(rowid, nombre)
+        SELECT length(nombre) * {NAME_KEY} + services.id, nombre
+        FROM search_reindex JOIN services ON services.id = search_reindex.id
+        WHERE search_reindex.kind = 'services' AND services.activo ORDER BY 1""",
+
+    """DELETE FROM search_reindex WHERE kind = 'portfolio' AND id IN (
+        SELECT portfolio.id FROM search_reindex JOIN portfolio ON portfolio.id = search_reindex.id
+        JOIN search_portfolio ON search_portfolio.rowid = portfolio.id
+        WHERE search_reindex.kind = 'portfolio' AND portfolio.activo
+          AND search_portfolio.titulo IS portfolio.titulo
+          AND search_portfolio.descripcion IS portfolio.descripcion
+          AND search_portfolio.tecnologias IS portfolio.tecnologias)""",
+    f"""DELETE FROM search_portfolio_names WHERE rowid IN (
+        SELECT length(titulo) * {NAME_KEY} + rowid FROM search_portfolio
+        WHERE rowid IN (SELECT id FROM search_reindex WHERE kind = 'portfolio'))""",
+    "DELETE FROM search_portfolio WHERE rowid IN (SELECT id FROM search_reindex WHERE kind = 'portfolio')",
+    """INSERT INTO search_portfolio(rowid, titulo, descripcion, tecnologias)
+        SELECT portfolio.id, titulo, descripcion, tecnologias
+        FROM search_reindex JOIN portfolio ON portfolio.id = search_reindex.id
+        WHERE search_reindex.kind = 'portfolio' AND portfolio.activo ORDER BY 1""",
+    f"""INSERT INTO search_portfolio_names(rowid, titulo)
+        SELECT length(titulo) * {NAME_KEY} + portfolio.id, titulo
+        FROM search_reindex JOIN portfolio ON portfolio.id = search_reindex.id
+        WHERE search_reindex.kind = 'portfolio' AND portfolio.activo ORDER BY 1""",
+]
+
+def reindex(connection, services=(), portfolio=()):
+    """Bring the index up to date for the given service and project ids
+
+    Ids that were deactivated (or no longer exist) are dropped from the
+    index. Only these rows are touched, and only if their text changed; the
+    tables are not optimized, FTS5 merges the new segments as it goes.
+    """
+    connection.execute(text("""CREATE TEMP TABLE IF NOT EXISTS search_reindex(
+        kind TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (kind, id)) WITHOUT ROWID"""))
+    connection.execute(text("DELETE FROM search_reindex"))
+    for kind, ids in (('services', services), ('portfolio', portfolio)):
+        if ids:
+            connection.exec_driver_sql("INSERT OR IGNORE INTO search_reindex(kind, id) VALUES (?, ?)",
+                                       [(kind, record_id) for record_id in ids])
+    for statement in REINDEX:
+        connection.execute(text(statement))
+    connection.execute(text("DELETE FROM search_reindex"))
+
+@contextmanager
+def bulk_load(connection):
+    """Pause the sync triggers during a large load and index what it wrote
+
+    Yields {'services': set(), 'portfolio': set()} for the loader to fill
+    with the ids it inserted or updated; those rows, and the services of
+    renamed categories, are re-indexed once the load is done (see
+    reindex()). Indexing row by row through the triggers is several times
+    slower for loads of many thousands of rows. Use it inside the load's
+    transaction, so a failed load restores the triggers too.
+    """
+    touched = {'services': set(), 'portfolio': set()}
+    if not is_installed(connection):
+        yield touched
+        return
+    categories = dict(connection.execute(text("SELECT id, nombre FROM categories")).all())
+    for name in TRIGGERS:
+        connection.execute(text(f"DROP TRIGGER {name}"))
+    yield touched
+    for category_id, name in connection.execute(text("SELECT id, nombre FROM categories")).all():
+        if category_id in categories and categories[category_id] != name:
+            touched['services'].update(connection.execute(text(
+                "SELECT id FROM services WHERE id_categoria = :id"), {'id': category_id}).scalars())
+    reindex(connection, touched['services'], touched['portfolio'])
+    for statement in TRIGGERS.values():
+        connection.execute(text(statement))
+
+def install(connection):
+    """Create the search tables and triggers if missing; return True if created"""
+    if connection.dialect.name != 'sqlite' or is_installed(connection):
+        return False
+    # Indexes created by older versions have no name tables: start over
+    for name in TRIGGERS:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+    for table in TABLES:
+        connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    for statement in SCHEMA:
+        connection.execute(text(statement))
+    rebuild_index(connection)
+    return True
+
+def build_query(query):
+    """FTS5 MATCH expression for free text, or None if it has no words
+
+    Every word must match; the last one also matches as a prefix. Words
+    are quoted, so FTS5 operators typed by visitors have no effect.
+    """
+    terms = [f'"{term}"' for term in TOKEN_RE.findall(query)[:MAX_TERMS]]
+    if not terms:
+        return None
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def fold(word):
+    """A word as the tokenizer indexes it: lowercase, without accents"""
+    return ''.join(char for char in unicodedata.normalize('NFKD', word)
+                   if not unicodedata.combining(char)).lower()
+
+def _letter_variants():
+    """{'a': 'aAªÀÁÂ…', 'n': 'nNÑñ…', ...}: the Latin letters that fold()
+    turns into each letter"""
+    variants = {}
+    for letter in map(chr, range(ord('A'), 0x250)):
+        if letter.isalpha() and len(fold(letter)) == 1:
+            variants[fold(letter)] = variants.get(fold(letter), '') + letter
+    return variants
+
+LETTER_VARIANTS = _letter_variants()
+
+def matcher(query):
+    """Pattern of the words a build_query() query matches, like the index
+    matches them: regardless of case and accents, the last one as a prefix"""
+    terms = [''.join(f'[{LETTER_VARIANTS.get(char, char)}]' for char in fold(term))
+             for term in TOKEN_RE.findall(query)[:MAX_TERMS]]
+    terms[-1] += r'\w*'
+    return re.compile(rf"\b(?:{'|'.join(terms)})\b", re.IGNORECASE)
+
+def highlight(text, pattern, snippet=False):
+    """Escape text and wrap the words that match pattern in <mark> tags
+
+    With snippet, only SNIPPET_WORDS words are kept, from the first match
+    on, with '…' where the text was cut, like FTS5's snippet().
+    Highlighting here instead of with highlight() and snippet() saves
+    running the MATCH again for each result row.
+    """
+    text = text or ''
+    spans = [found.span() for found in pattern.finditer(text)]
+    start, end = 0, len(text)
+    before = after = ''
+    if snippet:
+        window = SNIPPET_RE.search(text)
+        if window and spans and spans[0][1] > window.end():
+            window = SNIPPET_RE.match(text, spans[0][0])
+            start, before = window.start(), '…'
+        if window and TOKEN_RE.search(text, window.end()):
+            end, after = window.end(), '…'
+
+    parts, position = [before], start
+    for found_start, found_end in spans:
+        if start <= found_start and found_end <= end:
+            parts += [escape(text[position:found_start]),
+                      '<mark>', escape(text[found_start:found_end]), '</mark>']
+            position = found_end
+    parts += [escape(text[position:end]), after]
+    return Markup(''.join(parts))
+
+def _search(table, columns, match, limit):
+    """(rowid, tier, rank, *columns) rows of one index, best first
+
+    Rows whose name matches every word come first (tier 0). They are read
+    from the name table in rowid order, shortest names first, and the
+    length is their rank, so a prefix that matches thousands of names
+    still only reads a page of them, old or new. The other matches (tier
+    1) are only looked at when the names don't fill the limit, and only
+    the newest RANKED_CANDIDATES of them are ranked with bm25. Ranks are
+    only comparable within a tier.
+    """
+    rows = db.session.execute(text(
+        f"SELECT {table}.rowid, 0, names.key / {NAME_KEY}, {columns} FROM ("
+        f"SELECT rowid AS key FROM {table}_names WHERE {table}_names MATCH :match "
+        f"ORDER BY rowid LIMIT :limit"
+        f") AS names JOIN {table} ON {table}.rowid = names.key % {NAME_KEY} ORDER BY names.key"
+    ), {'match': match, 'limit': limit}).all()
+    if len(rows) < limit:
+        rows += db.session.execute(text(
+            f"SELECT rowid, 1, rank, {columns} FROM ("
+            f"SELECT rowid, rank, {columns} FROM {table} WHERE {table} MATCH :match "
+            f"AND rowid NOT IN :found ORDER BY rowid DESC LIMIT :candidates"
+            f") ORDER BY rank LIMIT :limit"
+        ).bindparams(bindparam('found', expanding=True)),
+            {'match': match, 'found': [row[0] for row in rows], 'candidates': RANKED_CANDIDATES,
+             'limit': limit - len(rows)}).all()
+    return rows
+
+def search(query, limit=20):
+    """Ranked services and projects for the /buscar page
+
+    Returns (services, projects) as lists of (record, highlighted name,
+    highlighted description snippet).
+    """
+    match = build_query(query)
+    if match is None:
+        return [], []
+
+    service_ids = [row[0] for row in _search('search_services', 'nombre', match, limit)]
+    project_ids = [row[0] for row in _search('search_portfolio', 'titulo', match, limit)]
+
+    services = {service.id: service for service in
+                Service.query.options(joinedload(Service.category))
+                .filter(Service.id.in_(service_ids))}
+    projects = {project.id: project for project in
+                Portfolio.query.filter(Portfolio.id.in_(project_ids))}
+    pattern = matcher(query)
+    return ([(services[row_id], highlight(services[row_id].nombre, pattern),
+              highlight(services[row_id].descripcion, pattern, snippet=True))
+             for row_id in service_ids if row_id in services],
+            [(projects[row_id], highlight(projects[row_id].titulo, pattern),
+              highlight(projects[row_id].descripcion, pattern, snippet=True))
+             for row_id in project_ids if row_id in projects])
+
+def suggest(query, limit=8):
+    """Typeahead suggestions read straight from the index, best first"""
+    match = build_query(query)
+    if match is None:
+        return []
+    suggestions = [
+        ((tier, rank), {'tipo': 'servicio', 'id': row_id, 'nombre': nombre, 'categoria': categoria,
+                        'url': url_for('servicio_detalle', service_id=row_id)})
+        for row_id, tier, rank, nombre, categoria in _search('search_services', 'nombre, categoria', match, limit)
+    ] + [
+        ((tier, rank), {'tipo': 'proyecto', 'id': row_id, 'nombre': titulo, 'categoria': None,
+                        'url': url_for('portafolio_detalle', portfolio_id=row_id)})
+        for row_id, tier, rank, titulo in _search('search_portfolio', 'titulo', match, limit)
+    ]
+    # Name matches first, shortest first; bm25 ranks are negative, lower is better
+    suggestions.sort(key=lambda item: item[0])
+    return [suggestion for _, suggestion in suggestions[:limit]]
+
+if __name__ == '__main__':
+    import sys
+    from app import app
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print(__doc__)
+        sys.exit(1)
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            if not install(connection):
+                rebuild_index(connection)
+            services = connection.execute(text("SELECT count(*) FROM search_services")).scalar()
+            projects = connection.execute(text("SELECT count(*) FROM search_portfolio")).scalar()
+    print(f"✅ Search index rebuilt ({services} services, {projects} projects)")
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+SQLite Tuning Profile for Production
+
+Every new SQLite connection gets the pragmas below, so readers keep
+reading while the admin or the form handlers write, and concurrent
+gunicorn workers wait for the write lock instead of failing with
+"database is locked":
+
+    SQLITE_JOURNAL_MODE=WAL          # readers don't block on writers (DELETE to opt out)
+    SQLITE_SYNCHRONOUS=NORMAL        # in WAL, durable except on power loss mid-checkpoint
+    SQLITE_BUSY_TIMEOUT_MS=5000      # wait this long for a lock before failing
+    SQLITE_CACHE_SIZE_KB=16384       # page cache per connection
+    SQLITE_MMAP_SIZE=268435456       # read the file through mmap (0 to disable)
+    SQLITE_TEMP_STORE=MEMORY         # temporary tables and sort spills
+    SQLITE_JOURNAL_SIZE_LIMIT=67108864   # truncate the WAL back to this after checkpoints
+
+Connections come from a QueuePool of SQLITE_POOL_SIZE (plus
+SQLITE_POOL_OVERFLOW) per process, shared by the request threads; a worker
+forked from a process that already opened connections (gunicorn --preload)
+starts with a fresh pool instead of reusing its parent's. Every
+SQLITE_MAINTENANCE_INTERVAL seconds (0 disables it) a background thread,
+started with the first request of each process, runs PRAGMA optimize, which
+refreshes the query planner statistics that need it, and a passive WAL
+checkpoint.
+
+In-memory databases keep SQLite's defaults for the journal and mmap.
+
+Usage:
+    python sqlite_tuning.py            # show the effective settings
+    python sqlite_tuning.py optimize   # run the maintenance once
+"""
+
+from models import db
+from sqlalchemy import event
+import background
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_MODES = {'WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'OFF'}
+SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+TEMP_STORES = {'DEFAULT', 'FILE', 'MEMORY'}
+
+# Pragmas shown by the CLI, in this order
+REPORTED_PRAGMAS = ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size',
+                    'mmap_size', 'temp_store', 'journal_size_limit')
+
+def _choice(config, key, choices):
+    value = str(config[key]).upper()
+    if value not in choices:
+        raise ValueError(f'{key} must be one of {", ".join(sorted(choices))}, not {config[key]}')
+    return value
+
+def _is_sqlite(uri):
+    return uri.startswith('sqlite')
+
+def _is_memory(uri):
+    return uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri
+
+def set_defaults(config):
+    config.setdefault('SQLITE_JOURNAL_MODE', 'WAL')
+    config.setdefault('SQLITE_SYNCHRONOUS', 'NORMAL')
+    config.setdefault('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    config.setdefault('SQLITE_CACHE_SIZE_KB', 16384)
+    config.setdefault('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+    config.setdefault('SQLITE_TEMP_STORE', 'MEMORY')
+    config.setdefault('SQLITE_JOURNAL_SIZE_LIMIT', 64 * 1024 * 1024)
+    config.setdefault('SQLITE_POOL_SIZE', 5)
+    config.setdefault('SQLITE_POOL_OVERFLOW', 10)
+    config.setdefault('SQLITE_MAINTENANCE_INTERVAL', 3600)
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database; set before db.init_app"""
+    set_defaults(config)
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    if not _is_sqlite(uri) or _is_memory(uri):
+        return {}
+    return {
+        'pool_size': int(config['SQLITE_POOL_SIZE']),
+        'max_overflow': int(config['SQLITE_POOL_OVERFLOW']),
+        # Pooled connections move between request threads
+        'connect_args': {'check_same_thread': False,
+                         'timeout': int(config['SQLITE_BUSY_TIMEOUT_MS']) / 1000},
+    }
+
+def connection_pragmas(config, uri=None, read_only=False):
+    """PRAGMA statements run on every new connection
+
+    Read-only connections (the read replica, see replica.py) can't change
+    the journal, so they only get the cache settings and query_only.
+    """
+    set_defaults(config)
+    uri = uri or config['SQLALCHEMY_DATABASE_URI']
+    pragmas = []
+    if not _is_memory(uri):
+        if not read_only:
+            pragmas.append(f"PRAGMA journal_mode={_choice(config, 'SQLITE_JOURNAL_MODE', JOURNAL_MODES)}")
+            pragmas.append(f"PRAGMA journal_size_limit={int(config['SQLITE_JOURNAL_SIZE_LIMIT'])}")
+        pragmas.append(f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}")
+    if read_only:
+        pragmas.append("PRAGMA query_only=1")
+    else:
+        pragmas.append(f"PRAGMA synchronous={_choice(config, 'SQLITE_SYNCHRONOUS', SYNCHRONOUS_MODES)}")
+    pragmas += [
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        # Negative sizes are in KiB rather than pages
+        f"PRAGMA cache_size={-int(config['SQLITE_CACHE_SIZE_KB'])}",
+        f"PRAGMA temp_store={_choice(config, 'SQLITE_TEMP_STORE', TEMP_STORES)}",
+    ]
+    return pragmas
+
+def apply_pragmas(engine, pragmas):
+    """Run the pragmas on every new connection of an engine"""
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+def dispose_after_fork(engine):
+    """Give a forked worker its own pool instead of its parent's connections"""
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+def run_maintenance(engine):
+    """Refresh planner statistics and checkpoint the WAL; return the checkpoint result"""
+    with engine.connect() as connection:
+        connection.exec_driver_sql('PRAGMA optimize')
+        # PASSIVE never waits for readers or writers; journal_size_limit trims the file
+        busy, wal_pages, checkpointed = connection.exec_driver_sql('PRAGMA wal_checkpoint(PASSIVE)').one()
+        connection.commit()
+    return {'busy': busy, 'wal_pages': wal_pages, 'checkpointed': checkpointed}
+
+def _maintenance_loop(app, interval):
+    stop_event = threading.Event()
+    while not stop_event.wait(interval):
+        try:
+            with app.app_context():
+                run_maintenance(db.engine)
+        except Exception:
+            logger.exception('SQLite maintenance failed')
+
+def _start_maintenance_thread(app, interval):
+    threading.Thread(target=_maintenance_loop, args=(app, interval),
+                     name='sqlite-maintenance', daemon=True).start()
+
+def init_app(app):
+    """Apply the pragmas to every connection of db.engine; call after db.init_app"""
+    if not _is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    pragmas = connection_pragmas(app.config)
+
+    with app.app_context():
+        engine = db.engine
+
+    apply_pragmas(engine, pragmas)
+    dispose_after_fork(engine)
+
+    interval = float(app.config['SQLITE_MAINTENANCE_INTERVAL'])
+    if interval > 0:
+        background.on_first_request(app, _start_maintenance_thread, app, interval)
+
+if __name__ == '__main__':
+    import sys
+    os.environ['OUTBOX_WORKER'] = 'none'
+    from app import app
+
+    with app.app_context():
+        if sys.argv[1:] == ['optimize']:
+            result = run_maintenance(db.engine)
+            print(f"✅ Optimized; checkpointed {result['checkpointed']} of {result['wal_pages']} WAL pages")
+        else:
+            with db.engine.connect() as connection:
+                for name in REPORTED_PRAGMAS:
+                    print(f"{name:20} {connection.exec_driver_sql(f'PRAGMA {name}').scalar()}")
@@ -8,6 +8,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initFormValidation();
     initTooltips();
     initDropdowns();
+    initSearch();
     
 });
 
@@ -247,47 +248,101 @@ function initDropdowns() {
     const servicioSelect = document.getElementById('servicio_id');
     
     if (categoriaSelect && servicioSelect) {
-        categoriaSelect.addEventListener('change', function() {
-            const categoriaId = this.value;
+        // Fetch the whole catalogue once, before the first change
+        const catalog = loadCatalog(categoriaSelect.dataset.catalogVersion);
+        
+        function showServices(categoriaId, selectedId) {
+            if (!categoriaId) {
+                servicioSelect.innerHTML = '<option value="">Primero selecciona una categoría</option>';
+                servicioSelect.disabled = true;
+                return Promise.resolve();
+            }
             
             // Reset service select
             servicioSelect.innerHTML = '<option value="">Cargando servicios...</option>';
             servicioSelect.disabled = true;
             
-            if (categoriaId) {
-                // Fetch services for the selected category
-                fetch(`/api/servicios/${categoriaId}`)
-                    .then(response => {
-                        if (!response.ok) {
-                            throw new Error('Network response was not ok');
-                        }
-                        return response.json();
-                    })
-                    .then(data => {
-                        servicioSelect.innerHTML = '<option value="">Selecciona un servicio (opcional)</option>';
-                        
-                        data.forEach(service => {
-                            const option = document.createElement('option');
-                            option.value = service.id;
-                            option.textContent = service.nombre;
-                            servicioSelect.appendChild(option);
-                        });
-                        
-                        servicioSelect.disabled = false;
-                    })
-                    .catch(error => {
-                        console.error('Error loading services:', error);
-                        servicioSelect.innerHTML = '<option value="">Error cargando servicios</option>';
-                        showNotification('Error al cargar los servicios. Por favor intente de nuevo.', 'error');
+            return catalog
+                .then(categorias => {
+                    servicioSelect.innerHTML = '<option value="">Selecciona un servicio (opcional)</option>';
+                    
+                    (categorias[categoriaId] || []).forEach(([id, nombre]) => {
+                        const option = document.createElement('option');
+                        option.value = id;
+                        option.textContent = nombre;
+                        option.selected = String(id) === selectedId;
+                        servicioSelect.appendChild(option);
                     });
-            } else {
-                servicioSelect.innerHTML = '<option value="">Primero selecciona una categoría</option>';
-                servicioSelect.disabled = true;
-            }
+                    
+                    servicioSelect.disabled = false;
+                })
+                .catch(error => {
+                    console.error('Error loading services:', error);
+                    servicioSelect.innerHTML = '<option value="">Error cargando servicios</option>';
+                    showNotification('Error al cargar los servicios. Por favor intente de nuevo.', 'error');
+                });
+        }
+        
+        categoriaSelect.addEventListener('change', function() {
+            showServices(this.value);
         });
+        
+        // Pre-select the service linked from a service page (?servicio=<id>)
+        const servicioParam = new URLSearchParams(window.location.search).get('servicio');
+        if (servicioParam) {
+            catalog.then(categorias => {
+                const categoriaId = Object.keys(categorias).find(id =>
+                    categorias[id].some(([servicioId]) => String(servicioId) === servicioParam));
+                if (categoriaId) {
+                    categoriaSelect.value = categoriaId;
+                    showServices(categoriaId, servicioParam);
+                }
+            }).catch(() => {});
+        }
     }
 }
 
+// Category id → [[service id, name], ...] of the whole catalogue, kept in
+// sessionStorage until the catalogue version rendered in the page changes
+function loadCatalog(version) {
+    const storageKey = 'araizaCatalog';
+    try {
+        const stored = JSON.parse(sessionStorage.getItem(storageKey));
+        if (stored && stored.version === version) {
+            return Promise.resolve(stored.categorias);
+        }
+    } catch (error) {
+        // Storage disabled or corrupt entry; fetch it again
+    }
+    
+    const categorias = {};
+    function fetchPage(cursor) {
+        const url = '/api/catalogo?fields=nombre' + (cursor ? `&cursor=${cursor}` : '');
+        return fetch(url)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Network response was not ok');
+                }
+                return response.json();
+            })
+            .then(data => {
+                Object.entries(data.categorias).forEach(([id, services]) => {
+                    categorias[id] = (categorias[id] || []).concat(services);
+                });
+                return data.next ? fetchPage(data.next) : categorias;
+            });
+    }
+    
+    return fetchPage(null).then(categorias => {
+        try {
+            sessionStorage.setItem(storageKey, JSON.stringify({version: version, categorias: categorias}));
+        } catch (error) {
+            // Storage full or disabled; the catalogue is used for this page only
+        }
+        return categorias;
+    });
+}
+
 // Notification system
 function showNotification(message, type = 'info', duration = 5000) {
     // Create notification element
@@ -332,7 +387,7 @@ function initLazyLoading() {
     });
 }
 
-// Search functionality (if needed)
+// Search box typeahead
 function initSearch() {
     const searchInput = document.getElementById('searchInput');
     const searchResults = document.getElementById('searchResults');
@@ -357,11 +412,36 @@ function initSearch() {
     }
 }
 
-// Perform search (placeholder function)
+// Perform search: typeahead suggestions from the search index
 function performSearch(query) {
-    // This would typically make an AJAX request to a search endpoint
-    console.log('Searching for:', query);
-    // Implement actual search functionality here
+    const searchResults = document.getElementById('searchResults');
+    
+    fetch(`/api/buscar?q=${encodeURIComponent(query)}`)
+        .then(response => response.json())
+        .then(suggestions => {
+            // Ignore answers to queries the visitor has already typed past
+            if (document.getElementById('searchInput').value.trim() !== query) {
+                return;
+            }
+            
+            searchResults.innerHTML = '';
+            suggestions.forEach(function(suggestion) {
+                const item = document.createElement('a');
+                item.className = 'dropdown-item';
+                item.href = suggestion.url;
+                item.textContent = suggestion.nombre;
+                
+                const detail = document.createElement('small');
+                detail.className = 'text-muted ms-2';
+                detail.textContent = suggestion.categoria || 'Proyecto';
+                item.appendChild(detail);
+                searchResults.appendChild(item);
+            });
+            searchResults.style.display = suggestions.length ? 'block' : 'none';
+        })
+        .catch(error => {
+            console.error('Error searching:', error);
+        });
 }
 
 // Utility functions
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Storage for Admin Uploads
+
+Uploads are stored as static/images/<folder>/<sha256 prefix>.<ext>. The file
+is streamed to disk in chunks while it is hashed, so it is never buffered
+whole in memory. Uploading the same image twice reuses the existing file,
+and two different uploads can never collide. A URL's content never changes,
+so these files (and their variants) are served with far-future immutable
+cache headers.
+
+Files no longer referenced by any Service or Portfolio can be removed with:
+    python storage.py gc [--dry-run]
+"""
+
+from flask import current_app, request
+from models import db, Service, Portfolio
+from images import url_to_path
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+CHUNK_SIZE = 64 * 1024
+HASH_LENGTH = 32
+
+# Folders under static/images that hold admin uploads
+UPLOAD_FOLDERS = ('servicios', 'portfolio', 'uploads')
+
+# <hash>.<ext> originals and <hash>-<variant>.<ext> resized copies
+CONTENT_ADDRESSED_RE = re.compile(r'^images/[\w-]+/[0-9a-f]{%d}(-\w+)?\.\w+$' % HASH_LENGTH)
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def save_upload(file, folder, extension):
+    """Store an uploaded file under its content hash and return its URL"""
+    upload_folder = os.path.join(current_app.static_folder, 'images', folder)
+    os.makedirs(upload_folder, exist_ok=True)
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                tmp.write(chunk)
+
+        filename = f'{digest.hexdigest()[:HASH_LENGTH]}.{extension}'
+        final_path = os.path.join(upload_folder, filename)
+        if os.path.exists(final_path):
+            # Identical content is already stored
+            os.remove(tmp_path)
+        else:
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return f'{current_app.static_url_path}/images/{folder}/{filename}'
+
+def make_immutable(response):
+    """Let clients keep a response whose URL changes with its content"""
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    response.cache_control.no_cache = None
+    return response
+
+def add_immutable_headers(response):
+    """Far-future caching for content-addressed static files"""
+    if request.endpoint == 'static' and response.status_code in (200, 304):
+        filename = (request.view_args or {}).get('filename', '')
+        if CONTENT_ADDRESSED_RE.match(filename):
+            make_immutable(response)
+    return response
+
+def init_app(app):
+    app.after_request(add_immutable_headers)
+
+def referenced_files():
+    """Filesystem paths of every image still used by a Service or Portfolio"""
+    referenced = set()
+    for model in (Service, Portfolio):
+        rows = db.session.query(model.imagen, model.imagen_variantes).filter(model.imagen.isnot(None))
+        for imagen, variantes in rows:
+            referenced.add(url_to_path(imagen))
+            for variant in json.loads(variantes) if variantes else []:
+                referenced.add(url_to_path(variant['url']))
+    referenced.discard(None)
+    return {os.path.normpath(path) for path in referenced}
+
+def collect_garbage(dry_run=False, grace_seconds=3600):
+    """Delete unreferenced files in the upload folders; return their paths"""
+    referenced = referenced_files()
+    cutoff = time.time() - grace_seconds
+    removed = []
+
+    for folder in UPLOAD_FOLDERS:
+        directory = os.path.join(current_app.static_folder, 'images', folder)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            path = os.path.normpath(os.path.join(directory, name))
+            # Recent files may belong to an upload that hasn't committed yet
+            if path in referenced or not os.path.isfile(path) or os.path.getmtime(path) > cutoff:
+                continue
+            if not dry_run:
+                os.remove(path)
+            removed.append(path)
+    return removed
+
+if __name__ == '__main__':
+    import sys
+    from app import app
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'gc':
+        print(__doc__)
+        sys.exit(1)
+
+    dry_run = '--dry-run' in sys.argv
+    with app.app_context():
+        removed = collect_garbage(dry_run=dry_run)
+    for path in removed:
+        print(f"🗑️  {path}")
+    action = "Would remove" if dry_run else "Removed"
+    print(f"✅ {action} {len(removed)} unreferenced files")
@@ -0,0 +1,58 @@
+"""Streamed rendering for the long listing pages.
+
+With ``STREAM_TEMPLATES`` enabled, /servicios and /portafolio send the
+page while it is being rendered: the ``<head>`` and navigation leave as
+the first chunk, and the cards follow as the rows arrive from the database
+in batches, instead of after the whole list has been loaded and rendered.
+"""
+from flask import current_app, stream_template
+from itertools import islice
+
+# Jinja yields many tiny strings; send them in pieces of about this size
+STREAM_CHUNK_SIZE = 8 * 1024
+
+# Rows fetched from the database at a time
+BATCH_SIZE = 100
+
+
+class LazyRows:
+    """Query results fetched in batches as a template iterates them
+
+    Truthiness only fetches the first row, so ``{% if rows %}`` keeps
+    working. The rows can be iterated once.
+    """
+
+    def __init__(self, query, batch_size=BATCH_SIZE):
+        self._rows = iter(query.yield_per(batch_size))
+        self._head = None
+
+    def __bool__(self):
+        if self._head is None:
+            self._head = list(islice(self._rows, 1))
+        return bool(self._head)
+
+    def __iter__(self):
+        yield from self._head or ()
+        self._head = []
+        yield from self._rows
+
+
+def _coalesce(pieces, size):
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_page(template_name, **context):
+    """Streamed HTML response of a template, flushed in STREAM_CHUNK_SIZE pieces"""
+    # stream_template keeps the request context alive while generating
+    pieces = stream_template(template_name, **context)
+    return current_app.response_class(_coalesce(pieces, STREAM_CHUNK_SIZE), mimetype='text/html')